@@ -0,0 +1,226 @@
+"""
+Local stand-in for the parts of the Slack Web API the updater uses:
+users.setPresence, users.profile.set and users.profile.get.
+
+It keeps the presence and custom status of every token in memory and can
+inject latency, HTTP 429 responses with a Retry-After header, and server
+errors. With `enforce_tiers`, each token is also held to Slack's per-method
+rate limits. Point the updater at it with `--slack-api-url` or
+`SlackUpdater(token, base_url=...)`.
+
+    python benchmarks/fake_slack.py --port 8080 --latency-ms 50 --ratelimit-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# per-minute limits, matching METHOD_RATES in slack_status_updater.dispatch
+TIER_LIMITS = {
+    "users.setPresence": 20,
+    "users.profile.set": 50,
+    "users.profile.get": 100,
+}
+
+
+class FakeSlack:
+    """
+    In-process fake Slack Web API server.
+
+    `latency` and `jitter` are in seconds; every request sleeps for
+    `latency + uniform(0, jitter)`. A request is answered with 429 and
+    `Retry-After: retry_after` with probability `ratelimit_rate`. With
+    probability `error_rate`, it is answered with `error_status` and
+    `{"ok": false}` instead.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        ratelimit_rate: float = 0.0,
+        retry_after: int = 1,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        enforce_tiers: bool = False,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.ratelimit_rate = ratelimit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.enforce_tiers = enforce_tiers
+        self.calls: Counter = Counter()
+        self.ratelimited: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.presence: Dict[str, str] = {}
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # (method, token) -> (window start, calls in window)
+        self._windows: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def status_of(self, token: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Return (presence, status_text, status_emoji) last set for `token`."""
+        profile = self.profiles.get(token, {})
+        return self.presence.get(token), profile.get("status_text"), profile.get("status_emoji")
+
+    def _over_tier(self, method: str, token: str) -> bool:
+        # fixed one-minute windows, like Slack documents its limits
+        now = time.monotonic()
+        start, count = self._windows.get((method, token), (now, 0))
+        if now - start >= 60:
+            start, count = now, 0
+        self._windows[(method, token)] = (start, count + 1)
+        return count >= TIER_LIMITS[method]
+
+    def handle(self, method: str, token: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """Return (status, headers, body) for one API call."""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        with self._lock:
+            if method not in TIER_LIMITS:
+                return 404, {}, {"ok": False, "error": "unknown_method"}
+            self.calls[method] += 1
+            if not token:
+                return 200, {}, {"ok": False, "error": "not_authed"}
+            roll = self._random.random()
+            if roll < self.ratelimit_rate or (self.enforce_tiers and self._over_tier(method, token)):
+                self.ratelimited[method] += 1
+                return 429, {"Retry-After": str(self.retry_after)}, {"ok": False, "error": "ratelimited"}
+            if roll < self.ratelimit_rate + self.error_rate:
+                self.errors[method] += 1
+                return self.error_status, {}, {"ok": False, "error": "internal_error"}
+
+            if method == "users.setPresence":
+                presence = params.get("presence")
+                if presence not in ("auto", "away"):
+                    return 200, {}, {"ok": False, "error": "invalid_presence"}
+                self.presence[token] = presence
+                return 200, {}, {"ok": True}
+            if method == "users.profile.set":
+                profile = params.get("profile") or {}
+                if isinstance(profile, str):
+                    profile = json.loads(profile)
+                stored = self.profiles.setdefault(token, {})
+                stored.update(profile)
+                return 200, {}, {"ok": True, "profile": stored}
+            return 200, {}, {"ok": True, "profile": dict(self.profiles.get(token, {}))}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _respond(self) -> None:
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params: Dict[str, Any] = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if body:
+                    if self.headers.get("Content-Type", "").startswith("application/json"):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body.decode()))
+                auth = self.headers.get("Authorization", "")
+                token = auth[len("Bearer "):] if auth.startswith("Bearer ") else params.get("token", "")
+
+                status, headers, payload = fake.handle(method, token, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+
+        return Handler
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fault-injection options shared with the load driver."""
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra uniformly distributed delay")
+    parser.add_argument("--ratelimit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a server error")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected errors")
+    parser.add_argument("--enforce-tiers", action="store_true", help="Apply Slack's per-token, per-method rate limits")
+    parser.add_argument("--seed", type=int, help="Seed for the injected faults")
+
+
+def from_arguments(args: argparse.Namespace, host: str = "127.0.0.1", port: int = 0) -> FakeSlack:
+    return FakeSlack(
+        host=host,
+        port=port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        ratelimit_rate=args.ratelimit_rate,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        enforce_tiers=args.enforce_tiers,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = from_arguments(args, host=args.host, port=args.port)
+    print(f"Fake Slack API listening on {fake.base_url}", flush=True)
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+        print(f"calls: {dict(fake.calls)}  429s: {dict(fake.ratelimited)}  errors: {dict(fake.errors)}")
+
+
+if __name__ == "__main__":
+    main()
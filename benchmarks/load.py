@@ -0,0 +1,259 @@
+"""
+End-to-end load driver against the local fake Slack API (fake_slack.py).
+
+Sends `--bursts` rounds of status updates for `--users` users through one of
+the dispatch paths and reports throughput, dispatch and fan-out latency and
+lost updates:
+
+  sync   SlackUpdater.apply_status called in turn on one thread, as the
+         default timer loop does; failures are not retried
+  queue  DispatchQueue (--rate-limit-queue), with retries
+  async  AsyncSlackDispatcher (--async-dispatch)
+
+Dispatch latency runs from the instant an update was due until Slack (the
+fake) accepted all of its calls. Each burst is timed from its due instant to
+its last completed update (its fan-out latency); throughput is completed
+updates over that time, per burst and over all bursts, so the idle
+--burst-interval between bursts does not count. Every burst changes each user's status, so
+the applied-state cache never skips one. "stale" counts users whose status on
+the fake server is not the last one sent once everything has settled.
+
+    python benchmarks/load.py --users 1000 --mode async --latency-ms 50 --ratelimit-rate 0.02
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_slack import add_arguments, from_arguments  # noqa: E402
+
+from slack_status_updater.slack import LazySlackUpdater, SlackUpdater  # noqa: E402
+
+
+class Recorder:
+    """Collects per-update outcomes from whatever thread completes them."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.failed = 0
+        # burst -> [updates completed, perf_counter() of the last completion]
+        self.bursts: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+
+    def done(self, burst: int, due: float, ok: bool) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            if ok:
+                self.latencies.append(now - due)
+                totals = self.bursts[burst]
+                totals[0] += 1
+                totals[1] = max(totals[1], now)
+            else:
+                self.failed += 1
+            self._settled.notify_all()
+
+    def wait(self, count: int, timeout: float) -> bool:
+        """Wait until `count` updates have completed or failed."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len(self.latencies) + self.failed < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._settled.wait(remaining)
+        return True
+
+
+class TimedSlackUpdater(LazySlackUpdater):
+    """LazySlackUpdater that reports when the queue managed to apply an update."""
+    __slots__ = ("recorder", "burst", "due")
+
+    def __init__(self, token: str, base_url: str, recorder: Recorder):
+        super().__init__(token, base_url=base_url)
+        self.recorder = recorder
+        self.burst = 0
+        self.due = 0.0
+
+    def apply_status(self, presence: str, text: str = "", emoji: str = "", expiration: int = 0) -> bool:
+        sent = super().apply_status(presence=presence, text=text, emoji=emoji, expiration=expiration)
+        self.recorder.done(self.burst, self.due, True)
+        return sent
+
+
+def burst_status(burst: int) -> Tuple[str, str, str]:
+    return ("away" if burst % 2 else "auto", f"Load test {burst}", ":stopwatch:")
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(p * len(ordered) + 0.5)) - 1))]
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake = from_arguments(args)
+    base_url = fake.start()
+    tokens = [f"xoxp-load-{n}" for n in range(args.users)]
+    recorder = Recorder()
+    extra: Dict[str, Any] = {}
+
+    queue = dispatcher = None
+    if args.mode == "sync":
+        updaters = [SlackUpdater(token, base_url=base_url) for token in tokens]
+    elif args.mode == "queue":
+        from slack_status_updater.dispatch import DispatchQueue
+
+        queue = DispatchQueue(workers=args.workers)
+        updaters = [TimedSlackUpdater(token, base_url, recorder) for token in tokens]
+    else:
+        from slack_status_updater.async_slack import AsyncSlackDispatcher
+
+        dispatcher = AsyncSlackDispatcher(
+            max_concurrency=args.max_concurrency,
+            per_token_concurrency=args.per_token_concurrency,
+            base_url=base_url,
+        )
+        dispatcher.start()
+
+    submitted = 0
+    started = time.perf_counter()
+    try:
+        for burst in range(args.bursts):
+            burst_due = started + burst * args.burst_interval
+            time.sleep(max(0.0, burst_due - time.perf_counter()))
+            presence, text, emoji = burst_status(burst)
+            for n, token in enumerate(tokens):
+                due = burst_due + (args.burst_spread * n / len(tokens) if args.burst_spread else 0.0)
+                time.sleep(max(0.0, due - time.perf_counter()))
+                submitted += 1
+                if args.mode == "sync":
+                    try:
+                        updaters[n].apply_status(presence=presence, text=text, emoji=emoji)
+                        recorder.done(burst, due, True)
+                    except Exception:
+                        recorder.done(burst, due, False)
+                elif args.mode == "queue":
+                    updaters[n].burst = burst
+                    updaters[n].due = due
+                    queue.submit(updaters[n], presence=presence, text=text, emoji=emoji)
+                else:
+                    future = dispatcher.submit(token, presence, (text, emoji))
+                    future.add_done_callback(
+                        lambda f, burst=burst, due=due: recorder.done(burst, due, _async_ok(f))
+                    )
+
+        if queue is not None:
+            # superseded and dropped updates never report back
+            deadline = time.monotonic() + args.timeout
+            while time.monotonic() < deadline:
+                settled = len(recorder.latencies) + queue.superseded + queue.dropped
+                if settled >= submitted:
+                    break
+                time.sleep(0.05)
+            extra = {"superseded": queue.superseded, "retried": queue.retried}
+            recorder.failed += queue.dropped
+        elif not recorder.wait(submitted, args.timeout):
+            print(f"Timed out after {args.timeout:.0f}s waiting for updates to settle", file=sys.stderr)
+    finally:
+        if queue is not None:
+            queue.close()
+        if dispatcher is not None:
+            dispatcher.close()
+        fake.stop()
+
+    final = burst_status(args.bursts - 1)
+    stale = sum(1 for token in tokens if fake.status_of(token) != final)
+    completed = len(recorder.latencies)
+    bursts = []
+    for burst in range(args.bursts):
+        count, finished_at = recorder.bursts.get(burst, (0, 0.0))
+        fan_out = finished_at - (started + burst * args.burst_interval) if count else 0.0
+        bursts.append({
+            "completed": count,
+            "updates_per_second": _rate(count, fan_out),
+            "fan_out_ms": round(fan_out * 1000, 2) if count else None,
+        })
+    return {
+        "mode": args.mode,
+        "users": args.users,
+        "bursts": args.bursts,
+        "submitted": submitted,
+        "completed": completed,
+        "failed": recorder.failed,
+        **extra,
+        "stale_users": stale,
+        "updates_per_second": _rate(completed, sum((b["fan_out_ms"] or 0) / 1000 for b in bursts)),
+        "latency_ms": {
+            "p50": round(percentile(recorder.latencies, 0.50) * 1000, 2),
+            "p99": round(percentile(recorder.latencies, 0.99) * 1000, 2),
+            "max": round(max(recorder.latencies, default=float("nan")) * 1000, 2),
+        },
+        "per_burst": bursts,
+        "server": {
+            "calls": dict(fake.calls),
+            "ratelimited": dict(fake.ratelimited),
+            "errors": dict(fake.errors),
+        },
+    }
+
+
+def _rate(count: int, seconds: float) -> Optional[float]:
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def _async_ok(future: Future) -> bool:
+    try:
+        return all(future.result())
+    except Exception:
+        return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--mode", choices=["sync", "queue", "async"], default="async")
+    parser.add_argument("--bursts", type=int, default=3, help="Rounds of updates. Default: 3")
+    parser.add_argument("--burst-interval", type=float, default=5.0, help="Seconds between rounds. Default: 5")
+    parser.add_argument("--burst-spread", type=float, default=0.0,
+                        help="Spread each round's updates evenly over this many seconds (0 = all due at once)")
+    parser.add_argument("--workers", type=int, default=4, help="--mode queue: sender threads. Default: 4")
+    parser.add_argument("--max-concurrency", type=int, default=100)
+    parser.add_argument("--per-token-concurrency", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Max seconds to wait for updates to settle")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the updater's log output")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    latency = report["latency_ms"]
+    print(f"mode={report['mode']} users={report['users']} bursts={report['bursts']} submitted={report['submitted']}")
+    print(f"completed {report['completed']}  failed {report['failed']}  stale users {report['stale_users']}"
+          + "".join(f"  {key} {report[key]}" for key in ("superseded", "retried") if key in report))
+    print(f"throughput {report['updates_per_second']} updates/s")
+    for n, burst in enumerate(report["per_burst"]):
+        print(f"  burst {n}: {burst['completed']} updates, {burst['updates_per_second']} updates/s, "
+              f"fan-out {burst['fan_out_ms']}ms")
+    print(f"dispatch latency p50 {latency['p50']}ms  p99 {latency['p99']}ms  max {latency['max']}ms")
+    server = report["server"]
+    print(f"server calls {server['calls']}  429s {server['ratelimited']}  errors {server['errors']}")
+
+
+if __name__ == "__main__":
+    main()
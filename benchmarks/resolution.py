@@ -0,0 +1,145 @@
+"""
+Resolution regression check.
+
+  * `Timeline.job_at`, as built by `Scheduler`, against the original
+    carry-forward rule (the most recent start wins, skipping starts whose
+    time_range does not cover the time; ties go to the later entry), for
+    every minute of the week. The rule is applied to the raw YAML entries,
+    so it does not depend on validation or on the compiled timeline. Runs
+    on config.example.yml and a few synthetic configs with shared and with
+    distinct, midnight-crossing ranges.
+  * `timers.next_fire_time` across a spring-forward gap and a fall-back
+    fold, including the rescheduling from a fired instant.
+
+Exits with status 1 on any mismatch.
+
+    python benchmarks/resolution.py [--config config.example.yml]
+"""
+import argparse
+import os
+import sys
+from bisect import bisect_right
+from datetime import datetime, time as dt_time
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from slack_status_updater.config import load_config, validate_config  # noqa: E402
+from slack_status_updater.scheduler import Scheduler  # noqa: E402
+from slack_status_updater.timeline import MINUTES_PER_DAY, MINUTES_PER_WEEK  # noqa: E402
+from slack_status_updater.timers import TimerHeap, next_fire_time  # noqa: E402
+from slack_status_updater.utils import is_time_in_range, parse_days, parse_time  # noqa: E402
+
+from synthetic import make_config  # noqa: E402
+
+
+class NullUpdater:
+    saved_calls = 0
+
+    def set_status(self, presence: str, text: str = "", emoji: str = "", due=None, expiration: int = 0) -> None:
+        pass
+
+
+def reference_starts(entries: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+    """(minute of the week, entry index) of every start, in the order the rule searches them."""
+    starts = []
+    for index, entry in enumerate(entries):
+        t = parse_time(entry["time"])
+        for day in parse_days(entry["days"]):
+            starts.append((day * MINUTES_PER_DAY + t.hour * 60 + t.minute, index))
+    # stable: at the same minute the later entry comes last, so it is found first going backwards
+    starts.sort(key=lambda s: s[0])
+    return starts
+
+
+def reference_job(entries: List[Dict[str, Any]], starts: List[Tuple[int, int]], minute: int) -> Optional[int]:
+    """Index of the entry active at `minute` of the week under the carry-forward rule, or None."""
+    if not starts:
+        return None
+    target = dt_time(minute % MINUTES_PER_DAY // 60, minute % 60)
+    last = bisect_right(starts, (minute, len(entries))) - 1  # -1 wraps to the last start of the previous week
+    for offset in range(len(starts)):
+        index = starts[(last - offset) % len(starts)][1]
+        time_range = entries[index].get("time_range")
+        if time_range and not is_time_in_range(target, parse_time(time_range["start"]), parse_time(time_range["end"])):
+            continue
+        return index
+    return None
+
+
+def check_config(name: str, config: Dict[str, Any]) -> int:
+    entries = config["intervals"]
+    intervals = validate_config(config, use_env=False)
+    index_of = {id(interval): i for i, interval in enumerate(intervals)}
+    starts = reference_starts(entries)
+    timeline = Scheduler(NullUpdater(), intervals, timers=TimerHeap()).timeline
+
+    mismatches = 0
+    for minute in range(MINUTES_PER_WEEK):
+        job = timeline.job_at(minute)
+        got = None if job is None else index_of[id(job)]
+        expected = reference_job(entries, starts, minute)
+        if got != expected:
+            if mismatches < 5:
+                print(f"  {name}: minute {minute}: timeline has intervals[{got}], expected intervals[{expected}]")
+            mismatches += 1
+    print(f"{name:<32} {MINUTES_PER_WEEK} minutes, {mismatches} mismatches")
+    return mismatches
+
+
+def check_dst() -> int:
+    tz = ZoneInfo("America/New_York")
+    sunday = 6 * MINUTES_PER_DAY
+
+    def at(*args, fold: int = 0) -> datetime:
+        return datetime(*args, tzinfo=tz, fold=fold)
+
+    # (description, minute of the week, now, expected instant)
+    cases = [
+        ("gap: 02:30 fires at 03:30 EDT", sunday + 150, at(2026, 3, 7, 12, 0), at(2026, 3, 8, 3, 30)),
+        ("gap: the next week is back to 02:30", sunday + 150, at(2026, 3, 8, 3, 30), at(2026, 3, 15, 2, 30)),
+        ("fold: 01:30 fires at its first occurrence", sunday + 90, at(2026, 10, 31, 12, 0), at(2026, 11, 1, 1, 30)),
+        ("fold: in the second pass, the second one", sunday + 90, at(2026, 11, 1, 1, 10, fold=1),
+         at(2026, 11, 1, 1, 30, fold=1)),
+        ("fold: past the first, next week", sunday + 90, at(2026, 11, 1, 1, 45), at(2026, 11, 8, 1, 30)),
+        ("fold: past the second, next week", sunday + 90, at(2026, 11, 1, 1, 45, fold=1), at(2026, 11, 8, 1, 30)),
+        ("plain: Monday 09:00", 540, at(2026, 10, 17, 12, 0), at(2026, 10, 19, 9, 0)),
+    ]
+    failures = 0
+    for description, minute, now, expected in cases:
+        got = next_fire_time(minute, now)
+        ok = got.timestamp() == expected.timestamp()
+        failures += not ok
+        print(f"{description:<44} {'ok' if ok else f'FAILED: {got.isoformat()} != {expected.isoformat()}'}")
+
+    # a timer rescheduled from the instant it fired at must not fire again in the repeated hour
+    fired = next_fire_time(sunday + 90, at(2026, 10, 31, 12, 0)).timestamp()
+    again = next_fire_time(sunday + 90, datetime.fromtimestamp(fired, tz))
+    ok = again.timestamp() == at(2026, 11, 8, 1, 30).timestamp()
+    failures += not ok
+    print(f"{'fold: fires once per week':<44} {'ok' if ok else f'FAILED: fires again at {again.isoformat()}'}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.example.yml"))
+    args = parser.parse_args()
+
+    failures = check_config(os.path.basename(args.config), load_config(args.config))
+    for seed in range(3):
+        failures += check_config(f"synthetic[40 intervals, seed {seed}]", make_config(40, seed=seed, range_share=0.5))
+        failures += check_config(
+            f"synthetic[40 ranges, seed {seed}]", make_config(40, seed=seed, range_share=1.0, distinct_ranges=True)
+        )
+    failures += check_dst()
+    if failures:
+        print(f"\n{failures} check(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Startup regression check.
+
+Measures, in fresh interpreters:
+  * the cumulative `python -X importtime` cost of `slack_status_updater.app`,
+    and that none of the lazily imported modules are pulled in by it;
+  * time-to-first-status: from spawning `python` to the initial status being
+    handed to the Slack client, with a cold and a warm schedule cache.
+    The Slack client is real (so importing slack_sdk is counted) but its
+    methods are replaced, so nothing goes over the network.
+
+Exits with status 1 if a budget is exceeded.
+
+    python benchmarks/startup.py [--config config.example.yml] [--runs 5]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must only be imported when the feature using them is first needed
+LAZY_MODULES = [
+    "slack_sdk",
+    "yaml",
+    "schedule",
+    "aiohttp",
+    "slack_status_updater.calendar",
+    "slack_status_updater.watcher",
+    "http.server",
+]
+
+FIRST_STATUS_CHILD = """
+import time
+STARTED = time.perf_counter()
+import os, sys
+sys.path.insert(0, {root!r})
+from slack_status_updater.app import SlackStatusUpdater
+from slack_status_updater.slack import SlackUpdater
+
+class Offline:
+    def users_setPresence(self, **kwargs): pass
+    def users_profile_set(self, **kwargs): pass
+
+class FirstStatus(SlackUpdater):
+    def __init__(self, token):
+        super().__init__(token)
+        self.client = Offline()
+
+    def set_status(self, **kwargs):
+        super().set_status(**kwargs)
+        print("first-status", flush=True)
+        os._exit(0)
+
+SlackStatusUpdater(updater_factory=FirstStatus, show_calendar=False, started=STARTED).run()
+print("no-status", flush=True)
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def measure_imports(module: str):
+    """Return (cumulative microseconds of `module`, set of all modules imported)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = 0
+    imported = set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        imported.add(match.group(3))
+        if match.group(3) == module:
+            cumulative = int(match.group(2))
+    return cumulative, imported
+
+
+def measure_first_status(workdir: str, env: dict) -> float:
+    """Return seconds from spawning the child until it reports its first status."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", FIRST_STATUS_CHILD.format(root=ROOT)],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=60,
+    )
+    elapsed = time.perf_counter() - start
+    if "first-status" not in proc.stdout:
+        raise RuntimeError(f"child did not set a status:\n{proc.stdout}{proc.stderr}")
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.example.yml"))
+    parser.add_argument("--runs", type=int, default=5, help="Best of N runs per measurement. Default: 5")
+    parser.add_argument("--import-budget-ms", type=float, default=100.0)
+    parser.add_argument("--first-status-budget-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    best_import = min(measure_imports("slack_status_updater.app")[0] for _ in range(args.runs)) / 1000
+    _, imported = measure_imports("slack_status_updater.app")
+    eager = [m for m in LAZY_MODULES if m in imported]
+    print(f"import slack_status_updater.app: {best_import:.1f}ms (budget {args.import_budget_ms:.0f}ms)")
+    if best_import > args.import_budget_ms:
+        failures.append("import time over budget")
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+
+    workdir = tempfile.mkdtemp(prefix="slack-status-startup-")
+    try:
+        shutil.copy(args.config, os.path.join(workdir, "config.yml"))
+        env = dict(os.environ, SLACK_TOKEN="xoxp-benchmark", SLACK_STATUS_CACHE_DIR=os.path.join(workdir, "cache"))
+        env.pop("PYTHONPATH", None)
+
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(env["SLACK_STATUS_CACHE_DIR"], ignore_errors=True)
+            cold.append(measure_first_status(workdir, env))
+        warm = [measure_first_status(workdir, env) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for label, samples in (("cold cache", cold), ("warm cache", warm)):
+        best = min(samples) * 1000
+        print(f"time to first status, {label}: {best:.1f}ms (budget {args.first_status_budget_ms:.0f}ms)")
+        if best > args.first_status_budget_ms:
+            failures.append(f"time to first status ({label}) over budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
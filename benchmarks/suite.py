@@ -0,0 +1,252 @@
+"""
+Benchmark suite for the scheduling, calendar and validation hot paths.
+
+    python benchmarks/suite.py run [--quick] [--only PATTERN] [--output results.json]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 20]
+
+`run` prints one line per benchmark and, with `--output`, writes the results as
+JSON. `compare` lines up two such files and exits with status 1 if any
+benchmark got slower by more than `--threshold` percent. Every metric is
+"lower is better". Numbers are only comparable between runs on the same
+machine, so keep one baseline per machine (e.g. CI runner type).
+
+Sizes: configs with 10, 1k and 100k intervals, 4k intervals that all carry a
+distinct time_range ("4k ranges", which catches compile costs that grow with
+the number of ranges), and 100 / 1k users with 8 intervals each (`--quick`
+skips 100k intervals and 1k users).
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml  # noqa: E402
+
+from slack_status_updater.app import MultiUserStatusUpdater  # noqa: E402
+from slack_status_updater.calendar import WeekGrid, render_week_calendar  # noqa: E402
+from slack_status_updater.compiled import compile_config  # noqa: E402
+from slack_status_updater.config import parse_config, validate_config  # noqa: E402
+from slack_status_updater.scheduler import Scheduler  # noqa: E402
+from slack_status_updater.timeline import Timeline  # noqa: E402
+from slack_status_updater.timers import TimerHeap  # noqa: E402
+
+from synthetic import make_config, make_profiles, write_profiles_dir  # noqa: E402
+
+FORMAT = 1
+# (label, intervals, every interval has its own random time_range)
+INTERVAL_SIZES = [("10", 10, False), ("1k", 1_000, False), ("100k", 100_000, False), ("4k ranges", 4_000, True)]
+USER_SIZES = [("100", 100), ("1k", 1_000)]
+QUICK_SKIP = {"100k", "1k users"}
+
+# (name, unit, measure) - `measure` runs the benchmark and returns its value
+Benchmark = Tuple[str, str, Callable[[], float]]
+
+
+class NullUpdater:
+    saved_calls = 0
+
+    def set_status(self, presence: str, text: str = "", emoji: str = "", due=None, expiration: int = 0) -> None:
+        pass
+
+
+def measure(fn: Callable[[], object], repeat: int = 3, min_time: float = 0.2, inner: int = 1) -> float:
+    """
+    Return the best seconds per call of `fn` over `repeat` rounds, each running
+    for at least `min_time`. GC stays enabled since the startup paths allocate
+    heavily. Calls slower than a second are measured once.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            for _ in range(inner):
+                fn()
+            calls += inner
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed / calls)
+        if best > 1.0:
+            break
+    return best
+
+
+def _scheduled(intervals) -> Scheduler:
+    scheduler = Scheduler(NullUpdater(), intervals, timers=TimerHeap())
+    scheduler.schedule_jobs()
+    return scheduler
+
+
+def bench_intervals(label: str, n: int, distinct_ranges: bool, workdir: str) -> Iterator[Benchmark]:
+    config = make_config(n, range_share=1.0, distinct_ranges=True) if distinct_ranges else make_config(n)
+    data = yaml.dump(config, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper), sort_keys=False).encode()
+    path = os.path.join(workdir, f"config-{label}.yml")
+    with open(path, "wb") as f:
+        f.write(data)
+
+    intervals = validate_config(config)
+    scheduler = Scheduler(NullUpdater(), intervals, timers=TimerHeap())
+
+    def calendar(resolution: int) -> float:
+        return measure(lambda: render_week_calendar(intervals, resolution, timeline=scheduler.timeline)) * 1e3
+
+    def startup_cached() -> float:
+        compile_config(path)
+        return measure(lambda: _scheduled(compile_config(path)[1])) * 1e3
+
+    def timer_minutes() -> List[int]:
+        heap = _scheduled(intervals).timers._heap
+        return [timer.minute for _, _, timer in heap if not timer.cancelled]
+
+    yield f"validate_config[{label}]", "ms", lambda: measure(lambda: validate_config(config)) * 1e3
+    yield f"timeline_compile[{label}]", "ms", lambda: measure(lambda: Timeline(intervals)) * 1e3
+    yield f"get_current_job[{label}]", "us", lambda: measure(scheduler.get_current_job, inner=1000) * 1e6
+    yield f"week_grid[{label}]", "ms", lambda: measure(lambda: WeekGrid(scheduler.timeline)) * 1e3
+    # the grid is built once per timeline, so these time rendering alone
+    yield f"render_week_calendar[{label},30m]", "ms", lambda: calendar(30)
+    yield f"render_week_calendar[{label},60m]", "ms", lambda: calendar(60)
+    yield f"render_week_calendar[{label},1m]", "ms", lambda: calendar(1)
+    # parse + validate + compile + install timers, without and with the compiled cache
+    yield f"startup[{label}]", "ms", lambda: measure(lambda: _scheduled(validate_config(parse_config(data, path)))) * 1e3
+    yield f"startup_cached[{label}]", "ms", startup_cached
+    # the run loop wakes at least every `max_sleep` (60s) and timers fire on minute boundaries, so it
+    # wakes 60 times an hour whatever the schedule; what varies is how many of those wakeups fire timers
+    yield f"timer_fires_per_hour[{label}]", "count", lambda: len(timer_minutes()) / (7 * 24)
+
+
+def bench_users(label: str, users: int, workdir: str) -> Iterator[Benchmark]:
+    directory = os.path.join(workdir, f"profiles-{label}")
+    write_profiles_dir(directory, make_profiles(users))
+
+    def start(use_cache: bool) -> None:
+        app = MultiUserStatusUpdater(directory, updater_factory=lambda token: NullUpdater(), use_cache=use_cache)
+        app._setup()
+        for scheduler in app.schedulers.values():
+            scheduler.get_current_job()
+            scheduler.schedule_jobs()
+
+    def cached() -> float:
+        start(True)
+        return measure(lambda: start(True), repeat=2) * 1e3
+
+    yield f"multi_user_startup[{label} users]", "ms", lambda: measure(lambda: start(False), repeat=2) * 1e3
+    yield f"multi_user_startup_cached[{label} users]", "ms", cached
+
+
+def bench_first_status(workdir: str) -> Iterator[Benchmark]:
+    from startup import measure_first_status
+
+    config_dir = os.path.join(workdir, "first-status")
+    os.makedirs(config_dir)
+    shutil.copy(os.path.join(ROOT, "config.example.yml"), os.path.join(config_dir, "config.yml"))
+    env = dict(os.environ, SLACK_TOKEN="xoxp-benchmark", SLACK_STATUS_CACHE_DIR=os.path.join(config_dir, "cache"))
+    env.pop("PYTHONPATH", None)
+
+    def cold() -> float:
+        samples = []
+        for _ in range(3):
+            shutil.rmtree(env["SLACK_STATUS_CACHE_DIR"], ignore_errors=True)
+            samples.append(measure_first_status(config_dir, env))
+        return min(samples) * 1e3
+
+    yield "first_status[cold]", "ms", cold
+    yield "first_status[warm]", "ms", lambda: min(measure_first_status(config_dir, env) for _ in range(3)) * 1e3
+
+
+def run(args: argparse.Namespace) -> int:
+    workdir = tempfile.mkdtemp(prefix="slack-status-bench-")
+    os.environ["SLACK_STATUS_CACHE_DIR"] = os.path.join(workdir, "cache")
+    groups = [(label, bench_intervals, (label, n, distinct, workdir)) for label, n, distinct in INTERVAL_SIZES]
+    groups += [(f"{label} users", bench_users, (label, n, workdir)) for label, n in USER_SIZES]
+    groups.append(("first status", bench_first_status, (workdir,)))
+
+    results: Dict[str, Dict[str, object]] = {}
+    try:
+        for group, bench, bench_args in groups:
+            if args.quick and group in QUICK_SKIP:
+                continue
+            for name, unit, run_benchmark in bench(*bench_args):
+                if args.only and not fnmatch.fnmatch(name, args.only):
+                    continue
+                value = run_benchmark()
+                results[name] = {"value": round(value, 3), "unit": unit}
+                print(f"{name:<44} {value:>12.3f} {unit}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        report = {
+            "format": FORMAT,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "quick": args.quick,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'benchmark':<44} {'baseline':>16} {'current':>16} {'change':>9}")
+    for name in sorted(baseline.keys() | current.keys()):
+        old, new = baseline.get(name), current.get(name)
+        if old is None or new is None or old["unit"] != new["unit"]:
+            state = "new" if old is None else "missing" if new is None else "unit changed"
+            print(f"{name:<44} {state:>43}")
+            continue
+        unit = new["unit"]
+        change = (new["value"] - old["value"]) / old["value"] * 100 if old["value"] else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<44} {old['value']:>10.3f} {unit:<5} {new['value']:>10.3f} {unit:<5} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:g}%")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--quick", action="store_true", help="Skip the 100k-interval and 1k-user sizes")
+    run_parser.add_argument("--only", metavar="PATTERN", help="Only keep benchmarks matching this glob")
+    run_parser.add_argument("--output", metavar="FILE", help="Write the results as JSON")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=20.0, help="Allowed slowdown in percent. Default: 20")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
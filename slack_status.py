@@ -1,32 +1,388 @@
+import time
+
+# taken before anything else is imported, so the startup log includes import time
+STARTED = time.perf_counter()
+
 import logging
 import argparse
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
-def main() -> None:
-    """Main function to run the Slack status updater."""
-    from slack_status_updater.app import SlackStatusUpdater
-    app = SlackStatusUpdater()
-    app.run()
+def supervise(args: argparse.Namespace) -> None:
+    """Run the profiles in `args.shards` worker processes."""
+    from slack_status_updater.shards import ShardSupervisor
+
+    if args.use_cache:
+        # compile once up front so the workers all start from the cache
+        from slack_status_updater.compiled import compile_profiles
+        from slack_status_updater.config import ConfigError
+        try:
+            compile_profiles(args.profiles)
+        except ConfigError as e:
+            logging.error(e)
+            logging.error("Fix the profiles and try again")
+            return
+    ShardSupervisor(args.shards, main, (args,)).run()
+
+def load_schedules(args: argparse.Namespace):
+    """
+    Validate the config (or `--profiles`) and return the intervals and
+    timezone of every user (None in single-user mode), or None if invalid.
+    """
+    from slack_status_updater.config import ConfigError, get_timezone
+
+    try:
+        if args.profiles:
+            from slack_status_updater.compiled import compile_profiles
+            from slack_status_updater.config import load_profiles, validate_profiles
+            if args.use_cache:
+                profiles, schedules, _, _ = compile_profiles(args.profiles)
+            else:
+                profiles = load_profiles(args.profiles)
+                schedules = validate_profiles(profiles)
+            timezones = {str(profile["user"]): get_timezone(profile) for profile in profiles}
+        else:
+            from slack_status_updater.compiled import compile_config
+            from slack_status_updater.config import load_config, validate_config
+            if args.use_cache:
+                config, intervals, _ = compile_config()
+            else:
+                config = load_config()
+                intervals = validate_config(config)
+            schedules = {None: intervals}
+            timezones = {None: get_timezone(config)}
+    except ConfigError as e:
+        logging.error(e)
+        logging.error("Fix the configuration and try again")
+        return None
+    return schedules, timezones
+
+def simulate(args: argparse.Namespace) -> None:
+    """Replay the schedule over the `--simulate` range and print the Slack writes."""
+    import sys
+    from datetime import datetime
+
+    start, end = (datetime.fromisoformat(value) for value in args.simulate)
+    # per-transition scheduler logs would drown the event stream
+    logging.getLogger("slack_status_updater").setLevel(logging.WARNING)
+    loaded = load_schedules(args)
+    if loaded is None:
+        return
+    schedules, timezones = loaded
+
+    from slack_status_updater.simulate import simulate as run_simulation
+    out = sys.stdout if args.simulate_output == "-" else open(args.simulate_output, "w", encoding="utf-8")
+    try:
+        summary = run_simulation(
+            schedules,
+            start,
+            end,
+            use_expiration=args.status_expiration,
+            write=lambda line: out.write(line + "\n"),
+            timezones=timezones,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(summary, file=sys.stderr)
+
+def check(args: argparse.Namespace) -> int:
+    """
+    Statically analyze the schedule of every user and print the findings.
+    Returns the exit status: 1 if the config is invalid or has warnings.
+    """
+    from slack_status_updater.analyze import analyze, render_report
+
+    loaded = load_schedules(args)
+    if loaded is None:
+        return 1
+    schedules, _ = loaded
+    warnings = calls = 0
+    for user in sorted(schedules, key=lambda u: "" if u is None else u):
+        report = analyze(schedules[user])
+        warnings += report.warnings
+        calls += report.calls_per_week
+        print(render_report(report, user))
+    if len(schedules) > 1:
+        print(f"{len(schedules)} users: {calls} Slack calls per week, {warnings} warning(s)")
+    return 1 if warnings else 0
+
+def start_queries(app, port: int, addr: str) -> None:
+    """
+    Serve the status query API from the schedulers of `app`. It answers 503
+    until `app.run()` has built them.
+    """
+    from slack_status_updater.query import StatusQueries, start_query_server
+
+    if hasattr(app, "schedulers"):
+        # `app.users` is a snapshot swapped in by the timer thread, never a live view of the dict
+        queries = StatusQueries(
+            lambda user: app.schedulers.get(user) if user else None,
+            lambda: app.users,
+            ready=lambda: app.users is not None,
+        )
+    else:
+        # a single-user config has no user names, so any `user` parameter is unknown
+        queries = StatusQueries(
+            lambda user: app.scheduler if user is None else None,
+            lambda: [],
+            ready=lambda: app.scheduler is not None,
+        )
+    start_query_server(queries, port, addr)
+
+def main(args: argparse.Namespace, shard=None) -> None:
+    """
+    Main function to run the Slack status updater. `shard` restricts a
+    multi-user run to the users of one shard worker.
+    """
+    dispatcher = None
+    queue = None
+    updater_factory = None
+    base_url = args.slack_api_url
+    if args.metrics_port is not None:
+        from slack_status_updater.metrics import start_http_server
+        # one port per shard worker: PORT, PORT+1, ...
+        start_http_server(args.metrics_port + (shard.index if shard else 0), args.metrics_addr)
+    if args.async_dispatch:
+        from slack_status_updater.async_slack import AsyncSlackDispatcher, AsyncSlackUpdater
+        dispatcher = AsyncSlackDispatcher(
+            max_concurrency=args.max_concurrency,
+            per_token_concurrency=args.per_token_concurrency,
+            **({"base_url": base_url} if base_url else {}),
+        )
+        updater_factory = lambda token: AsyncSlackUpdater(dispatcher, token)
+    elif args.rate_limit_queue:
+        from slack_status_updater.dispatch import DispatchQueue, QueuedSlackUpdater
+        queue = DispatchQueue(workers=args.queue_workers)
+        updater_factory = lambda token: QueuedSlackUpdater(queue, token, base_url=base_url)
+    elif base_url:
+        from slack_status_updater.slack import LazySlackUpdater, SlackUpdater
+        updater_cls = LazySlackUpdater if args.profiles else SlackUpdater
+        updater_factory = lambda token: updater_cls(token, base_url=base_url)
+
+    journal_path = None
+    if args.use_journal:
+        from slack_status_updater.journal import journal_path as default_journal_path
+        shard_name = f"shard-{shard.index}-of-{shard.count}" if shard else None
+        journal_path = default_journal_path(args.profiles or "config.yml", shard_name)
+
+    try:
+        if args.profiles:
+            from slack_status_updater.app import MultiUserStatusUpdater
+            app = MultiUserStatusUpdater(
+                args.profiles,
+                scheduler_mode=args.scheduler,
+                updater_factory=updater_factory,
+                seed_status=args.seed_status,
+                watch=args.watch,
+                use_cache=args.use_cache,
+                started=STARTED,
+                owns=shard,
+                journal_path=journal_path,
+                use_expiration=args.status_expiration,
+            )
+        else:
+            from slack_status_updater.app import SlackStatusUpdater
+            app = SlackStatusUpdater(
+                scheduler_mode=args.scheduler,
+                updater_factory=updater_factory,
+                seed_status=args.seed_status,
+                watch=args.watch,
+                use_cache=args.use_cache,
+                show_calendar=args.show_calendar,
+                started=STARTED,
+                journal_path=journal_path,
+                use_expiration=args.status_expiration,
+            )
+        if dispatcher is not None:
+            # failed updates are rolled back on the timer thread, which owns the applied state
+            dispatcher.defer = app.call_soon
+        if args.query_port is not None:
+            start_queries(app, args.query_port + (shard.index if shard else 0), args.query_addr)
+        app.run()
+    finally:
+        if dispatcher is not None:
+            dispatcher.close()
+        if queue is not None:
+            queue.close()
 
 if __name__ == "__main__":
     # parse CLI option for calendar interval before importing app so the calendar module default can be set
     parser = argparse.ArgumentParser(description="Run Slack status updater")
     parser.add_argument(
         "--calendar-interval",
-        choices=["30", "60"],
-        default="30",
-        help="Calendar resolution in minutes (30 or 60). Default: 30",
+        type=int,
+        default=30,
+        metavar="MINUTES",
+        help="Calendar resolution in minutes, from 1 to 1440. Default: 30",
+    )
+    parser.add_argument(
+        "--calendar-format",
+        choices=["text", "json", "html", "segments"],
+        default="text",
+        help="How the calendar is printed: text table (default), JSON, HTML table, or one line per status change",
+    )
+    parser.add_argument(
+        "--scheduler",
+        choices=["timer", "poll"],
+        default="timer",
+        help="timer: sleep until the next transition (default); poll: legacy 1-second polling loop",
+    )
+    parser.add_argument(
+        "--profiles",
+        metavar="PATH",
+        help="Multi-user mode: directory of per-user YAML files or one multi-document YAML file",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        metavar="N",
+        help="With --profiles: spread the users over N worker processes by consistent hashing. Default: 1",
+    )
+    parser.add_argument(
+        "--async-dispatch",
+        action="store_true",
+        help="Send Slack updates from a pooled asyncio client instead of blocking the scheduler",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=100,
+        help="With --async-dispatch: max in-flight requests to Slack. Default: 100",
+    )
+    parser.add_argument(
+        "--per-token-concurrency",
+        type=int,
+        default=2,
+        help="With --async-dispatch: max in-flight requests per token. Default: 2",
+    )
+    parser.add_argument(
+        "--rate-limit-queue",
+        action="store_true",
+        help="Queue Slack updates behind per-method rate limits, retrying 429s after Retry-After",
+    )
+    parser.add_argument(
+        "--queue-workers",
+        type=int,
+        default=4,
+        help="With --rate-limit-queue: number of sender threads. Default: 4",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Reload config.yml (or the profiles) when it changes, rescheduling only what changed",
+    )
+    parser.add_argument(
+        "--seed-status-cache",
+        dest="seed_status",
+        action="store_true",
+        help="Read the current Slack status at startup so an identical initial status is not re-sent",
+    )
+    parser.add_argument(
+        "--slack-api-url",
+        metavar="URL",
+        help="Slack Web API base URL, e.g. a local fake server for load tests. Default: https://slack.com/api/",
+    )
+    parser.add_argument(
+        "--no-calendar",
+        dest="show_calendar",
+        action="store_false",
+        help="Do not print the weekly calendar at startup",
+    )
+    parser.add_argument(
+        "--no-schedule-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Always parse and validate the YAML instead of loading the compiled schedule cache",
+    )
+    parser.add_argument(
+        "--status-expiration",
+        action="store_true",
+        help="Let Slack clear a status that nothing follows (status_expiration) instead of a timer and API call",
+    )
+    parser.add_argument(
+        "--no-journal",
+        dest="use_journal",
+        action="store_false",
+        help="Do not keep the status journal; re-send the current status to every user at startup",
+    )
+    parser.add_argument(
+        "--simulate",
+        nargs=2,
+        metavar=("START", "END"),
+        help="Replay the schedule from START to END (ISO dates) on a virtual clock, print every Slack write "
+             "as a JSON line and a calls-per-minute summary on stderr, then exit",
+    )
+    parser.add_argument(
+        "--simulate-output",
+        default="-",
+        metavar="FILE",
+        help="With --simulate: write the events to FILE instead of stdout",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Analyze the schedule for dead, conflicting and redundant intervals, print the projected "
+             "Slack calls per week, then exit (status 1 if there are warnings)",
+    )
+    parser.add_argument(
+        "--query-port",
+        type=int,
+        metavar="PORT",
+        help="Serve the read-only status query API (/status, /segments, /calendar, /users) on PORT",
+    )
+    parser.add_argument(
+        "--query-addr",
+        default="",
+        metavar="ADDR",
+        help="With --query-port: address to listen on. Default: all interfaces",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve Prometheus metrics on http://<addr>:PORT/metrics",
+    )
+    parser.add_argument(
+        "--metrics-addr",
+        default="",
+        metavar="ADDR",
+        help="With --metrics-port: address to listen on. Default: all interfaces",
     )
     args = parser.parse_args()
+    if not 1 <= args.calendar_interval <= 1440:
+        parser.error("--calendar-interval must be between 1 and 1440")
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.shards > 1 and not args.profiles:
+        parser.error("--shards requires --profiles")
+    if args.simulate:
+        from datetime import datetime
+        try:
+            start, end = (datetime.fromisoformat(value) for value in args.simulate)
+        except ValueError as e:
+            parser.error(f"--simulate: {e}")
+        if end <= start:
+            parser.error("--simulate: END must be after START")
 
     # set the default in the calendar module so callers that don't pass interval_minutes pick it up
-    import importlib
-    try:
-        calendar_mod = importlib.import_module("slack_status_updater.calendar")
-        calendar_mod.DEFAULT_INTERVAL = int(args.calendar_interval)
-    except Exception:
-        # if calendar module isn't importable for some reason, ignore and continue
-        pass
+    if args.show_calendar:
+        import importlib
+        try:
+            calendar_mod = importlib.import_module("slack_status_updater.calendar")
+            calendar_mod.DEFAULT_INTERVAL = args.calendar_interval
+            calendar_mod.DEFAULT_FORMAT = args.calendar_format
+        except Exception:
+            # if calendar module isn't importable for some reason, ignore and continue
+            pass
 
-    main()
\ No newline at end of file
+    if args.check:
+        import sys
+        sys.exit(check(args))
+    elif args.simulate:
+        simulate(args)
+    elif args.shards > 1:
+        supervise(args)
+    else:
+        main(args)
\ No newline at end of file
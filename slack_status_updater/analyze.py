@@ -0,0 +1,158 @@
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .calendar import DAY_NAMES
+from .config import Interval
+from .timeline import MINUTES_PER_DAY, MINUTES_PER_WEEK, Timeline
+from .utils import format_minute
+
+
+class Finding(NamedTuple):
+    """One problem found in a schedule. `level` is "warning" or "info"."""
+    level: str
+    code: str
+    message: str
+
+
+class ScheduleReport(NamedTuple):
+    findings: List[Finding]
+    # distinct instants per week at which a timer fires
+    timer_fires_per_week: int
+    # Slack calls per week once the schedule has run for a week
+    calls_per_week: int
+
+    @property
+    def warnings(self) -> int:
+        return sum(1 for f in self.findings if f.level == "warning")
+
+
+def _label(index: int, interval: Interval) -> str:
+    status = " ".join(filter(None, (interval.status_emoji, repr(interval.status_text) if interval.status_text else "")))
+    return f"intervals[{index}] ({format_minute(interval.start)} {status or interval.presence})"
+
+
+def _days(minutes: List[int]) -> str:
+    if len(minutes) == 7:
+        return "every day"
+    return ", ".join(DAY_NAMES[m // MINUTES_PER_DAY] for m in sorted(minutes))
+
+
+def _status(interval: Optional[Interval]) -> Optional[Tuple[str, str, str]]:
+    return None if interval is None else (interval.presence, interval.status_text, interval.status_emoji)
+
+
+def analyze(intervals: List[Interval], timeline: Optional[Timeline] = None) -> ScheduleReport:
+    """
+    Statically check a validated schedule, in configuration order, for:
+
+    - dead intervals: no days, a time_range that excludes the interval's
+      own start time (its timer is always skipped), or an interval the
+      timeline never resolves to (always overridden at its start);
+    - same-instant conflicts: intervals starting at the same minute of the
+      week with different statuses (the one listed later wins);
+    - redundant transitions: starts that re-apply the status already set,
+      so their timer fires every week without changing anything.
+
+    It also projects the timer fires and Slack calls per week, replaying
+    the transitions the way `Scheduler` applies them (one write per
+    instant, unchanged presence/status skipped), without the status
+    expiration. It is one sweep over the sorted transitions plus a bisect
+    each; with the timeline compile (done here when no `timeline` is
+    given), the whole check is O(n log n) in the number of intervals, also
+    when every interval has its own time_range.
+    """
+    timeline = timeline or Timeline(intervals)
+    findings: List[Finding] = []
+
+    # minute of the week -> indexes of the intervals starting there, and whether a time_range ends there
+    starts: Dict[int, List[int]] = defaultdict(list)
+    ends: Dict[int, bool] = {}
+    for index, interval in enumerate(intervals):
+        for day in interval.weekdays():
+            starts[day * MINUTES_PER_DAY + interval.start].append(index)
+            if interval.has_range:
+                ends[(day * MINUTES_PER_DAY + interval.range_end) % MINUTES_PER_WEEK] = True
+
+    # dead intervals
+    resolved = {id(job) for _, _, job in timeline.segments() if job is not None}
+    for index, interval in enumerate(intervals):
+        if not interval.days:
+            findings.append(Finding("warning", "dead", f"{_label(index, interval)} is never applied: it has no days"))
+        elif not interval.covers(interval.start):
+            findings.append(Finding(
+                "warning", "dead",
+                f"{_label(index, interval)} is never applied: its time_range "
+                f"{format_minute(interval.range_start)}-{format_minute(interval.range_end)} excludes its start time",
+            ))
+        elif id(interval) not in resolved:
+            findings.append(Finding(
+                "warning", "dead",
+                f"{_label(index, interval)} is never active: intervals listed after it start at the same time",
+            ))
+
+    # same-instant starts, grouped per set of intervals
+    conflicts: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+    for minute, indexes in starts.items():
+        if len(indexes) > 1:
+            conflicts[tuple(indexes)].append(minute)
+    for indexes, minutes in conflicts.items():
+        winner = indexes[-1]
+        others = ", ".join(f"intervals[{i}]" for i in indexes[:-1])
+        day_list = _days(minutes)
+        if len({_status(intervals[i]) for i in indexes}) == 1:
+            findings.append(Finding(
+                "info", "duplicate",
+                f"{others} and {_label(winner, intervals[winner])} set the same status at the same time on {day_list}",
+            ))
+        else:
+            findings.append(Finding(
+                "warning", "conflict",
+                f"{others} and {_label(winner, intervals[winner])} start at the same time on {day_list}; "
+                f"intervals[{winner}] wins",
+            ))
+
+    # replay one week of transitions twice; the second pass is the steady state
+    transitions = sorted(starts.keys() | ends.keys())
+    presence: Optional[str] = None
+    profile: Optional[Tuple[str, str]] = None
+    calls = 0
+    redundant: Dict[int, List[int]] = defaultdict(list)
+    for steady in (False, True):
+        for minute in transitions:
+            indexes = starts.get(minute, ())
+            if minute not in ends and not any(intervals[i].covers(intervals[i].start) for i in indexes):
+                continue
+            job = timeline.job_at(minute)
+            sent = 0
+            if job is None:
+                sent += presence != "auto"
+                presence = "auto"
+            else:
+                sent += presence != job.presence
+                presence = job.presence
+                if job.status_text or job.status_emoji:
+                    sent += profile != (job.status_text, job.status_emoji)
+                    profile = (job.status_text, job.status_emoji)
+            if steady:
+                calls += sent
+                if not sent and minute not in ends and job is not None:
+                    redundant[id(job)].append(minute)
+
+    for index, interval in enumerate(intervals):
+        minutes = redundant.get(id(interval))
+        if minutes:
+            findings.append(Finding(
+                "info", "redundant",
+                f"{_label(index, interval)} re-applies the status already set on {_days(minutes)}; "
+                "its timer changes nothing there",
+            ))
+
+    return ScheduleReport(findings, len(transitions), calls)
+
+
+def render_report(report: ScheduleReport, user: Optional[str] = None) -> str:
+    """Format a report as plain text, one finding per line."""
+    prefix = f"user '{user}': " if user is not None else ""
+    lines = [f"{prefix}{finding.level}: {finding.message}" for finding in report.findings]
+    lines.append(f"{prefix}{report.timer_fires_per_week} timer fires and {report.calls_per_week} Slack calls per week")
+    return "\n".join(lines)
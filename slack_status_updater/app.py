@@ -1,18 +1,86 @@
 import logging
-from .config import load_config, validate_config, get_slack_token, ConfigError
-from .slack import SlackUpdater
+import os
+import signal
+from datetime import tzinfo
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import (
+    load_config,
+    validate_config,
+    get_slack_token,
+    get_timezone,
+    load_profile,
+    load_profiles,
+    profile_files,
+    validate_profiles,
+    ConfigError,
+    Interval,
+)
+from .compiled import compile_config, compile_profile, compile_profiles
+from .slack import SlackUpdater, LazySlackUpdater
 from .scheduler import Scheduler
-from .calendar import render_week_calendar
+from .timers import create_timers
+from .utils import PhaseTimer
 
 logger = logging.getLogger(__name__)
 
+def _timezones(profiles: List[Dict[str, Any]]) -> Dict[str, Optional[tzinfo]]:
+    """
+    The timezone of every profile, by user.
+    Raises `ConfigError` naming the user of an unknown zone.
+    """
+    zones: Dict[str, Optional[tzinfo]] = {}
+    for profile in profiles:
+        user = str(profile["user"])
+        try:
+            zones[user] = get_timezone(profile)
+        except ConfigError as e:
+            raise ConfigError(f"user '{user}': {e}")
+    return zones
+
 class SlackStatusUpdater:
     """
     The main application class that orchestrates the status updates.
     """
-    def __init__(self):
-        self.updater: SlackUpdater | None = None
+    def __init__(
+        self,
+        scheduler_mode: str = "timer",
+        updater_factory: Optional[Callable[[str], Any]] = None,
+        seed_status: bool = False,
+        watch: bool = False,
+        config_path: str = "config.yml",
+        use_cache: bool = True,
+        show_calendar: bool = True,
+        started: Optional[float] = None,
+        journal_path: Optional[str] = None,
+        use_expiration: bool = False,
+    ):
+        self.scheduler_mode = scheduler_mode
+        self.updater_factory = updater_factory or SlackUpdater
+        self.seed_status = seed_status
+        self.watch = watch
+        self.config_path = config_path
+        self.use_cache = use_cache
+        self.show_calendar = show_calendar
+        self.journal_path = journal_path
+        self.use_expiration = use_expiration
+        self.journal = None
+        # `started` is the perf_counter() reading at process start, so imports are timed too
+        self.phases = PhaseTimer(started)
+        if started is not None:
+            self.phases.mark("imports")
+        self.updater: Any = None
         self.scheduler: Scheduler | None = None
+        self._token: Optional[str] = None
+
+    def _load(self) -> Tuple[Dict[str, Any], List[Interval], bool]:
+        """
+        Returns (config, intervals, cached), from the compiled schedule cache
+        when it is enabled and up to date.
+        """
+        if self.use_cache:
+            return compile_config(self.config_path)
+        config = load_config(self.config_path)
+        return config, validate_config(config), False
 
     def _setup(self) -> bool:
         """
@@ -20,23 +88,70 @@ class SlackStatusUpdater:
         Returns True on success, False on failure.
         """
         try:
-            config = load_config()
-            validate_config(config)
+            config, intervals, cached = self._load()
+            tz = get_timezone(config)
         except ConfigError as e:
             logger.error(e)
             logger.error("Fix the configuration and try again")
             return False
+        self.phases.mark("config (cached)" if cached else "config")
 
         token = get_slack_token(config)
         if not token:
             logger.error("Slack token is not configured.")
             return False
 
-        self.updater = SlackUpdater(token)
-        intervals = config.get("intervals", [])
-        self.scheduler = Scheduler(self.updater, intervals)
+        self._token = token
+        self.updater = self.updater_factory(token)
+        if self.journal_path:
+            from .journal import StatusJournal
+
+            self.journal = StatusJournal(self.journal_path)
+            _attach_journal(self.journal, self.updater, token)
+        self.scheduler = Scheduler(
+            self.updater,
+            intervals,
+            timers=create_timers(self.scheduler_mode),
+            use_expiration=self.use_expiration,
+            tz=tz,
+        )
+        self.phases.mark("scheduler")
         return True
 
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        """Run `callback` once on the timer thread."""
+        self.scheduler.timers.call_soon(callback)
+
+    def _reload(self) -> None:
+        """
+        Re-reads the config after it changed on disk and applies the difference.
+        An invalid config is reported and the current schedule is kept.
+        """
+        try:
+            config, intervals, _ = self._load()
+            tz = get_timezone(config)
+        except ConfigError as e:
+            logger.error(e)
+            logger.error("Config change ignored - keeping the current schedule")
+            return
+
+        token = get_slack_token(config)
+        if token != self._token:
+            self._token = token
+            self.updater = self.scheduler.updater = self.updater_factory(token)
+            if self.journal is not None:
+                _attach_journal(self.journal, self.updater, token)
+            logger.info("Slack token changed")
+        if tz != self.scheduler.tz:
+            # every timer moves, so the schedule is rebuilt on the same timer backend
+            timers = self.scheduler.timers
+            self.scheduler.cancel_jobs()
+            self.scheduler = Scheduler(self.updater, intervals, timers=timers, use_expiration=self.use_expiration, tz=tz)
+            self.scheduler.schedule_jobs()
+            self.scheduler.apply_current_job(f"Timezone changed to {tz or 'local time'}")
+            return
+        self.scheduler.update_intervals(intervals)
+
     def run(self) -> None:
         """
         Runs the Slack status updater application.
@@ -45,27 +160,56 @@ class SlackStatusUpdater:
             return
 
         try:
-            # Display weekly calendar of statuses at startup
-            try:
-                print("\nWeekly schedule (hours 00-23, Mon → Sun):\n")
-                print(render_week_calendar(self.scheduler.intervals))
-            except Exception as e:
-                logger.warning("Failed to render week calendar: %s", e)
-
-            # Set initial status
+            if self.seed_status:
+                self.updater.seed_from_slack()
+                self.phases.mark("seed")
+
+            # Set initial status; with a journal, only if it is stale
             current_job = self.scheduler.get_current_job()
-            if current_job:
+            expiration = self.scheduler.status_expiration()
+            sent = False
+            if current_job and self.journal is not None and _is_applied(self.updater, current_job, expiration):
+                logger.info("Initial status already applied according to the status journal - not re-sent")
+            elif current_job:
                 self.updater.set_status(
-                    presence=current_job.get("presence", "auto"),
-                    text=current_job.get("status_text", ""),
-                    emoji=current_job.get("status_emoji", ""),
+                    presence=current_job.presence,
+                    text=current_job.status_text,
+                    emoji=current_job.status_emoji,
+                    expiration=expiration,
                 )
-                logger.info("Initial status set based on current schedule")
-            else:
+                sent = True
+            self.phases.mark("initial status")
+            if sent:
+                logger.info("Initial status set based on current schedule (%.1fms after start)",
+                            self.phases.elapsed() * 1000)
+            elif not current_job:
                 logger.info("No active schedule for current time/day - status not updated")
 
             # Schedule future updates
             self.scheduler.schedule_jobs()
+            self.phases.mark("timers")
+
+            # Display weekly calendar of statuses, once the initial status is out
+            if self.show_calendar:
+                try:
+                    from . import calendar
+
+                    if calendar.DEFAULT_FORMAT == "text":
+                        print("\nWeekly schedule (hours 00-23, Mon → Sun):\n")
+                    print(calendar.render_calendar(self.scheduler.intervals, timeline=self.scheduler.timeline))
+                except Exception as e:
+                    logger.warning("Failed to render week calendar: %s", e)
+                self.phases.mark("calendar")
+            logger.info("Startup: %s", self.phases.summary())
+
+            # Let `docker stop` end the loop cleanly instead of killing the process
+            signal.signal(signal.SIGTERM, lambda *_: self.scheduler.stop())
+
+            if self.watch:
+                from .watcher import FileWatcher
+
+                # reloads run on the timer thread, between jobs
+                FileWatcher([self.config_path], lambda _: self.scheduler.timers.call_soon(self._reload)).start()
 
             # Run the scheduler
             self.scheduler.run_forever()
@@ -74,3 +218,279 @@ class SlackStatusUpdater:
             logger.info("Interrupted, shutting down")
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
+        finally:
+            logger.info("Skipped %d redundant Slack calls", self.updater.saved_calls)
+            if self.journal is not None:
+                self.journal.close()
+
+
+def _attach_journal(journal, updater: Any, token: str) -> None:
+    # updaters without an applied-state cache (e.g. test doubles) are not journaled
+    applied = getattr(updater, "applied", None)
+    if applied is not None:
+        from .journal import account_key
+
+        journal.attach(account_key(token), applied)
+
+
+def _is_applied(updater: Any, job: Interval, expiration: int = 0) -> bool:
+    from .journal import is_applied
+
+    applied = getattr(updater, "applied", None)
+    return applied is not None and is_applied(applied, job.presence, job.status_text, job.status_emoji, expiration)
+
+
+class MultiUserStatusUpdater:
+    """
+    Drives the schedules of many users from one process.
+
+    Every user gets a `Scheduler` bound to a `LazySlackUpdater` (or whatever
+    `updater_factory` builds from the token), and all of them register their
+    timers on one shared timer backend, so the process runs a single loop no
+    matter how many users it serves.
+
+    With `owns`, only the users it returns True for are scheduled; the
+    others are ignored, also when their profiles change. This is how a shard
+    worker (see `shards.ShardSupervisor`) picks its users.
+    """
+    def __init__(
+        self,
+        profiles_path: str,
+        scheduler_mode: str = "timer",
+        updater_factory: Optional[Callable[[str], Any]] = None,
+        seed_status: bool = False,
+        watch: bool = False,
+        use_cache: bool = True,
+        started: Optional[float] = None,
+        owns: Optional[Callable[[str], bool]] = None,
+        journal_path: Optional[str] = None,
+        use_expiration: bool = False,
+    ):
+        self.profiles_path = profiles_path
+        self.owns = owns
+        self.journal_path = journal_path
+        self.use_expiration = use_expiration
+        self.journal = None
+        self.scheduler_mode = scheduler_mode
+        self.updater_factory = updater_factory or LazySlackUpdater
+        self.seed_status = seed_status
+        self.watch = watch
+        self.use_cache = use_cache
+        self.phases = PhaseTimer(started)
+        if started is not None:
+            self.phases.mark("imports")
+        self.timers = None
+        self.schedulers: Dict[str, Scheduler] = {}
+        # sorted snapshot of the users for other threads (e.g. the query API), replaced
+        # whole after every change; None until the schedulers are set up
+        self.users: Optional[Tuple[str, ...]] = None
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        # profile file -> user, in directory mode
+        self._sources: Dict[str, str] = {}
+
+    def _setup(self) -> bool:
+        """
+        Loads and validates all profiles and builds one scheduler per user.
+        Returns True on success, False on failure.
+        """
+        try:
+            if self.use_cache:
+                profiles, records, self._sources, cached = compile_profiles(self.profiles_path)
+            else:
+                cached = 0
+                if os.path.isdir(self.profiles_path):
+                    files = profile_files(self.profiles_path)
+                    profiles = [load_profile(f) for f in files]
+                    self._sources = {os.path.abspath(f): str(p["user"]) for f, p in zip(files, profiles)}
+                else:
+                    profiles = load_profiles(self.profiles_path)
+                records = validate_profiles(profiles)
+            zones = _timezones(profiles)
+        except ConfigError as e:
+            logger.error(e)
+            logger.error("Fix the profiles and try again")
+            return False
+        self.phases.mark(f"profiles ({cached} cached)" if cached else "profiles")
+        if self.owns is not None:
+            profiles = [p for p in profiles if self.owns(str(p["user"]))]
+
+        self.timers = create_timers(self.scheduler_mode)
+        if self.journal_path:
+            from .journal import StatusJournal
+
+            self.journal = StatusJournal(self.journal_path)
+        for profile in profiles:
+            user = str(profile["user"])
+            self._add_user(profile, records[user], zones[user])
+        self.users = tuple(sorted(self.schedulers))
+        self.phases.mark("schedulers")
+        logger.info("Loaded %d user profiles from %s", len(self.schedulers), self.profiles_path)
+        return True
+
+    def _add_user(self, profile: Dict[str, Any], intervals: List[Interval], tz: Optional[tzinfo]) -> Scheduler:
+        user = str(profile["user"])
+        token = get_slack_token(profile, use_env=False)
+        updater = self.updater_factory(token)
+        if self.journal is not None:
+            _attach_journal(self.journal, updater, token)
+        scheduler = Scheduler(
+            updater,
+            intervals,
+            timers=self.timers,
+            user=user,
+            use_expiration=self.use_expiration,
+            tz=tz,
+        )
+        self.schedulers[user] = scheduler
+        self._profiles[user] = profile
+        return scheduler
+
+    def _remove_user(self, user: str) -> None:
+        scheduler = self.schedulers.pop(user, None)
+        profile = self._profiles.pop(user, None)
+        if self.journal is not None and profile is not None:
+            from .journal import account_key
+
+            self.journal.forget(account_key(get_slack_token(profile, use_env=False)))
+        if scheduler is not None:
+            scheduler.cancel_jobs()
+            logger.info("Removed user '%s'", user)
+
+    def _upsert_user(self, profile: Dict[str, Any], intervals: List[Interval], tz: Optional[tzinfo]) -> None:
+        """
+        Adds a new user or applies a changed profile to an existing one,
+        leaving the timers of every other user untouched.
+        """
+        user = str(profile["user"])
+        if self.owns is not None and not self.owns(user):
+            return
+        old = self._profiles.get(user)
+        if old == profile:
+            return
+        if (
+            old is None
+            or get_slack_token(old, use_env=False) != get_slack_token(profile, use_env=False)
+            or self.schedulers[user].tz != tz
+        ):
+            self._remove_user(user)
+            scheduler = self._add_user(profile, intervals, tz)
+            scheduler.schedule_jobs()
+            scheduler.apply_current_job(f"User '{user}' loaded")
+            return
+        self._profiles[user] = profile
+        self.schedulers[user].update_intervals(intervals)
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        """Run `callback` once on the timer thread."""
+        self.timers.call_soon(callback)
+
+    def _reload(self, paths: List[str]) -> None:
+        """
+        Applies changed profile files. In directory mode only the users of
+        `paths` are touched; a multi-document file is re-read and diffed per user.
+        Invalid profiles are reported and the user keeps their current schedule.
+        """
+        if os.path.isdir(self.profiles_path):
+            for path in paths:
+                old_user = self._sources.pop(path, None)
+                if not os.path.exists(path):
+                    if old_user is not None:
+                        self._remove_user(old_user)
+                    continue
+                try:
+                    if self.use_cache:
+                        profile, intervals, _ = compile_profile(path)
+                    else:
+                        profile = load_profile(path)
+                        intervals = validate_config(profile, use_env=False)
+                    tz = get_timezone(profile)
+                except ConfigError as e:
+                    logger.error("Ignoring change to %s: %s", path, e)
+                    if old_user is not None:
+                        self._sources[path] = old_user
+                    continue
+                user = str(profile["user"])
+                if old_user is not None and old_user != user:
+                    self._remove_user(old_user)
+                self._sources[path] = user
+                self._upsert_user(profile, intervals, tz)
+            self.users = tuple(sorted(self.schedulers))
+            return
+
+        try:
+            if self.use_cache:
+                profiles, records, _, _ = compile_profiles(self.profiles_path)
+            else:
+                profiles = load_profiles(self.profiles_path)
+                records = validate_profiles(profiles)
+            zones = _timezones(profiles)
+        except ConfigError as e:
+            logger.error(e)
+            logger.error("Profiles change ignored - keeping the current schedules")
+            return
+        for user in [u for u in self.schedulers if u not in records]:
+            self._remove_user(user)
+        for profile in profiles:
+            user = str(profile["user"])
+            self._upsert_user(profile, records[user], zones[user])
+        self.users = tuple(sorted(self.schedulers))
+
+    def run(self) -> None:
+        """
+        Runs the status updates of all users until interrupted.
+        """
+        if not self._setup() or self.timers is None:
+            return
+
+        try:
+            applied = up_to_date = 0
+            for scheduler in self.schedulers.values():
+                if self.seed_status:
+                    scheduler.updater.seed_from_slack()
+                current_job = scheduler.get_current_job()
+                if not current_job:
+                    continue
+                expiration = scheduler.status_expiration()
+                # with a journal, users whose status is not stale are left alone
+                if self.journal is not None and _is_applied(scheduler.updater, current_job, expiration):
+                    up_to_date += 1
+                    continue
+                scheduler.updater.set_status(
+                    presence=current_job.presence,
+                    text=current_job.status_text,
+                    emoji=current_job.status_emoji,
+                    expiration=expiration,
+                )
+                applied += 1
+            self.phases.mark("initial status")
+            if self.journal is not None:
+                logger.info("Initial status set for %d of %d users (%d already up to date per the status journal)",
+                            applied, len(self.schedulers), up_to_date)
+            else:
+                logger.info("Initial status set for %d of %d users", applied, len(self.schedulers))
+
+            # timers go in only after every user got their initial status
+            for scheduler in self.schedulers.values():
+                scheduler.schedule_jobs()
+            self.phases.mark("timers")
+            logger.info("Startup: %s", self.phases.summary())
+
+            signal.signal(signal.SIGTERM, lambda *_: self.timers.stop())
+
+            if self.watch:
+                from .watcher import FileWatcher
+
+                FileWatcher([self.profiles_path], lambda paths: self.timers.call_soon(lambda: self._reload(paths))).start()
+
+            logger.info("Scheduler running %d timers for %d users...", len(self.timers), len(self.schedulers))
+            self.timers.run_forever()
+
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Interrupted, shutting down")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred: {e}")
+        finally:
+            saved = sum(s.updater.saved_calls for s in self.schedulers.values())
+            logger.info("Skipped %d redundant Slack calls", saved)
+            if self.journal is not None:
+                self.journal.close()
@@ -0,0 +1,255 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from slack_sdk.errors import SlackApiError
+
+from .metrics import IN_FLIGHT, SCHEDULER_LAG, slack_call
+from .slack import AppliedState, SlackUpdater
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSlackDispatcher:
+    """
+    Sends status updates with `slack_sdk`'s async client on an event loop
+    running in a background thread.
+
+    All users share one aiohttp session, so connections to Slack are pooled
+    and the number of in-flight requests to the host is capped at
+    `max_concurrency`. Each token is further limited to
+    `per_token_concurrency` in-flight requests. The presence and profile calls
+    of one update are issued concurrently.
+
+    A call answered with 429 is retried after its Retry-After, up to
+    `max_retries` times, unless a newer update of the same token was
+    submitted meanwhile.
+
+    A burst is the period from the first submitted update until nothing is
+    in flight anymore; its size and completion time are logged and kept in
+    `last_burst` as (updates, seconds).
+
+    `defer(callback)` runs the completion callbacks of `AsyncSlackUpdater`,
+    which touch its applied state. Set it to the `call_soon` of the timer
+    backend so they run on the timer thread that owns that state; by
+    default they run on the event loop thread.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 100,
+        per_token_concurrency: int = 2,
+        base_url: str = "https://slack.com/api/",
+        max_retries: int = 5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_token_concurrency = per_token_concurrency
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.defer: Callable[[Callable[[], None]], None] = lambda callback: callback()
+        self.retried = 0
+        self.last_burst: Optional[tuple[int, float]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+        # semaphores live only while some request of that token holds a reference
+        self._token_limits: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+        # token -> seq of its latest update, so a rate-limited call does not overwrite a newer one
+        self._latest: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._burst_size = 0
+        self._burst_started = 0.0
+        IN_FLIGHT.set_function(lambda: self._in_flight)
+
+    def start(self) -> None:
+        """Start the event loop thread and open the shared HTTP session."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="slack-dispatch", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self._loop).result()
+
+    async def _open(self) -> None:
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    def close(self) -> None:
+        """Close the HTTP session and stop the event loop thread."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def submit(
+        self,
+        token: str,
+        presence: Optional[str],
+        profile: Optional[tuple[str, str]] = None,
+        expiration: int = 0,
+    ) -> Future:
+        """
+        Queue a status update from any thread and return immediately.
+        `presence` and `profile` (text, emoji) are skipped when None; the
+        profile is sent with `expiration` as its status expiration. The
+        returned future resolves to (presence_ok, profile_ok) once the Slack
+        calls have completed.
+        """
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self._set_status(token, presence, profile, expiration), self._loop)
+
+    async def _skip(self) -> None:
+        return None
+
+    async def _call(self, limit: asyncio.Semaphore, token: str, seq: int, name: str, method, **kwargs):
+        for attempt in itertools.count(1):
+            try:
+                async with limit:
+                    with slack_call(name):
+                        return await method(**kwargs)
+            except SlackApiError as e:
+                response = e.response
+                if not (response.status_code == 429 or response.get("error") == "ratelimited"):
+                    raise
+                if attempt > self.max_retries or self._latest.get(token) != seq:
+                    raise
+                headers = {k.lower(): v for k, v in (response.headers or {}).items()}
+                retry_after = float(headers.get("retry-after", 1))
+                self.retried += 1
+                logger.warning("%s rate limited - retrying in %.1fs", name, retry_after)
+                await asyncio.sleep(retry_after)
+                if self._latest.get(token) != seq:
+                    logger.debug("%s superseded by a newer update - not retried", name)
+                    raise
+
+    async def _set_status(
+        self,
+        token: str,
+        presence: Optional[str],
+        profile: Optional[tuple[str, str]],
+        expiration: int = 0,
+    ) -> tuple[bool, bool]:
+        from slack_sdk.web.async_client import AsyncWebClient
+
+        if self._in_flight == 0:
+            self._burst_started = time.monotonic()
+            self._burst_size = 0
+        self._in_flight += 1
+        self._burst_size += 1
+
+        limit = self._token_limits.get(token)
+        if limit is None:
+            limit = asyncio.Semaphore(self.per_token_concurrency)
+            self._token_limits[token] = limit
+        seq = self._latest[token] = next(self._seq)
+
+        try:
+            client = AsyncWebClient(token=token, base_url=self.base_url, session=self._session)
+
+            if presence is not None:
+                presence_call = self._call(
+                    limit, token, seq, "users.setPresence", client.users_setPresence, presence=presence
+                )
+            else:
+                presence_call = self._skip()
+            if profile is not None:
+                body = {
+                    "status_text": profile[0],
+                    "status_emoji": profile[1],
+                    "status_expiration": expiration,
+                }
+                profile_call = self._call(
+                    limit, token, seq, "users.profile.set", client.users_profile_set, profile=body
+                )
+            else:
+                profile_call = self._skip()
+
+            results = await asyncio.gather(presence_call, profile_call, return_exceptions=True)
+            for result in results:
+                if isinstance(result, SlackApiError):
+                    logger.error("Slack API error: %s", result.response.get("error"))
+                elif isinstance(result, Exception):
+                    logger.error("Slack request failed: %s", result)
+            return not isinstance(results[0], Exception), not isinstance(results[1], Exception)
+        finally:
+            if self._latest.get(token) == seq:
+                del self._latest[token]
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                elapsed = time.monotonic() - self._burst_started
+                self.last_burst = (self._burst_size, elapsed)
+                logger.info("Dispatched %d status updates in %.2fs", self._burst_size, elapsed)
+
+
+class AsyncSlackUpdater:
+    """
+    Per-user handle with the `SlackUpdater.set_status` interface that hands
+    the update to a shared `AsyncSlackDispatcher` instead of blocking.
+
+    The applied-state cache is updated when the update is submitted, so a
+    duplicate queued behind it is suppressed too, and reset for any call that
+    turns out to have failed. The reset runs through the dispatcher's
+    `defer`, on the thread that calls `set_status`.
+    """
+    __slots__ = ("dispatcher", "token", "applied")
+
+    def __init__(self, dispatcher: AsyncSlackDispatcher, token: str):
+        self.dispatcher = dispatcher
+        self.token = token
+        self.applied = AppliedState()
+
+    @property
+    def saved_calls(self) -> int:
+        return self.applied.saved_calls
+
+    def seed_from_slack(self) -> None:
+        updater = SlackUpdater(self.token, base_url=self.dispatcher.base_url)
+        updater.seed_from_slack()
+        self.applied.text = updater.applied.text
+        self.applied.emoji = updater.applied.emoji
+
+    def set_status(self, presence: str, text: str = "", emoji: str = "", due: Optional[float] = None,
+                   expiration: int = 0) -> None:
+        applied = self.applied
+        send_presence = presence if applied.needs_presence(presence) else None
+        profile = None
+        if (text or emoji) and applied.needs_profile(text, emoji, expiration):
+            profile = (text, emoji)
+        if send_presence is None and profile is None:
+            return
+
+        if send_presence is not None:
+            applied.presence = presence
+        if profile is not None:
+            applied.text, applied.emoji = profile
+            applied.expires = expiration
+
+        def forget_failures(future: Future) -> None:
+            try:
+                presence_ok, profile_ok = future.result()
+            except Exception:
+                presence_ok = profile_ok = False
+            if send_presence is not None and not presence_ok and applied.presence == presence:
+                applied.presence = None
+            if profile is not None and not profile_ok and (applied.text, applied.emoji) == profile:
+                applied.text = applied.emoji = None
+            # journal what is now known to be applied, including any reset above
+            applied.commit()
+            if presence_ok and profile_ok and due is not None:
+                SCHEDULER_LAG.observe(time.time() - due)
+
+        future = self.dispatcher.submit(self.token, send_presence, profile, expiration)
+        future.add_done_callback(lambda done: self.dispatcher.defer(partial(forget_failures, done)))
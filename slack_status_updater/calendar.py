@@ -1,80 +1,107 @@
-from typing import List, Dict, Optional
-from datetime import time as dt_time
-from .utils import parse_time, parse_days, is_time_in_range
+import html
+import json
+from array import array
+from itertools import compress
+from operator import ne
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from .config import Interval
+from .timeline import Timeline, MINUTES_PER_DAY, MINUTES_PER_WEEK
+from .utils import format_minute
 
 DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 # Default calendar resolution in minutes (can be overridden by CLI)
 DEFAULT_INTERVAL = 30
 
-def _get_job_for_weekday_hour_min(intervals: List[Dict], weekday: int, hour: int, minute: int) -> Optional[Dict]:
+# Default output format of `render_calendar` (can be overridden by CLI)
+DEFAULT_FORMAT = "text"
+FORMATS = ("text", "json", "html", "segments")
+
+# (start, end, job id) with minutes of the week, end exclusive
+Segment = Tuple[int, int, int]
+
+
+class WeekGrid:
     """
-    Determine which interval (if any) would apply on a given weekday and time (hour, minute).
-    Behaviour: treat each configured interval as a 'start' event on its allowed days,
-    then pick the most recent start (searching backwards through the week) so that
-    a status carries forward until replaced. If a job has a time_range, that range
-    must include the target time to apply; otherwise it is skipped.
+    The whole week as a 10,080-entry array of job ids, one per minute, filled
+    segment by segment from a `Timeline`. `jobs[id]` is the job shown for an
+    id; id 0 is always None (no active status). Intervals that set the same
+    presence and status share an id. A calendar at any resolution is a
+    strided slice of `ids`, so no cell is resolved on its own.
     """
-    target_time = dt_time(hour, minute)
-
-    # Build flattened list of starts: (minute_of_week, job)
-    starts: List[tuple[int, Dict]] = []
-    for job in intervals:
-        try:
-            allowed_days = parse_days(job["days"])
-        except Exception:
-            continue
-        try:
-            t = parse_time(job["time"])
-        except Exception:
-            continue
-        minutes = t.hour * 60 + t.minute
-        for d in allowed_days:
-            starts.append((d * 1440 + minutes, job))
+    __slots__ = ("jobs", "ids")
 
-    if not starts:
-        return None
+    def __init__(self, timeline: Timeline):
+        self.jobs: List[Optional[Interval]] = [None]
+        by_status: Dict[Tuple[str, str, str], int] = {}
+        by_job: Dict[int, bytes] = {id(None): bytes(4)}
+        pieces: List[bytes] = []
+        for start, end, job in timeline.segments():
+            cell = by_job.get(id(job))
+            if cell is None:
+                key = (job.presence, job.status_text, job.status_emoji)
+                job_id = by_status.get(key)
+                if job_id is None:
+                    job_id = by_status[key] = len(self.jobs)
+                    self.jobs.append(job)
+                cell = by_job[id(job)] = array("i", [job_id]).tobytes()
+            pieces.append(cell * (end - start))
+        self.ids = array("i")
+        self.ids.frombytes(b"".join(pieces))
 
-    starts.sort(key=lambda x: x[0])
-    target_min = weekday * 1440 + hour * 60 + minute
-
-    # find index of last start <= target_min, or wrap to last start
-    idx = None
-    for i, (m, _) in enumerate(starts):
-        if m <= target_min:
-            idx = i
-    if idx is None:
-        idx = len(starts) - 1  # wrap to last start in previous week
-
-    # iterate backwards through starts (circular) and pick first job that is valid for target_time
-    n = len(starts)
-    for offset in range(n):
-        _, job = starts[(idx - offset) % n]
-
-        # If job defines a time_range, the target_time must fall into it
-        if "time_range" in job:
-            tr = job["time_range"]
-            try:
-                tr_start = parse_time(tr["start"])
-                tr_end = parse_time(tr["end"])
-            except Exception:
-                # malformed time_range -> skip this candidate
-                continue
-            if not is_time_in_range(target_time, tr_start, tr_end):
-                # this job doesn't cover target_time, keep searching backwards
-                continue
+    def column(self, day: int, resolution: int) -> array:
+        """Job ids of `day` (0=Monday) sampled every `resolution` minutes from 00:00."""
+        start = day * MINUTES_PER_DAY
+        return self.ids[start:start + MINUTES_PER_DAY:resolution]
+
+    def rows(self, resolution: int) -> List[Tuple[int, ...]]:
+        """Job ids per time slot, Monday to Sunday."""
+        return list(zip(*(self.column(day, resolution) for day in range(7))))
+
+    def segments(self, resolution: int = 1) -> List[Segment]:
+        """
+        Run-length encode the week at `resolution`. A cell covers `resolution`
+        minutes from its start, or up to midnight for the last cell of a day.
+        At resolution 1 this is the exact schedule.
+        """
+        cells = array("i")
+        for day in range(7):
+            cells += self.column(day, resolution)
+        slots = len(cells) // 7
+        # indexes of the cells that differ from the one before, compared in C
+        firsts = [0, *compress(range(1, len(cells)), map(ne, cells[1:], cells[:-1]))]
+        starts = [i // slots * MINUTES_PER_DAY + i % slots * resolution for i in firsts]
+        ends = starts[1:] + [MINUTES_PER_WEEK]
+        return [(start, end, cells[i]) for i, start, end in zip(firsts, starts, ends)]
 
-        # otherwise this job is considered active (persists) until replaced
-        return job
 
-    return None
+_GRIDS: "WeakKeyDictionary[Timeline, WeekGrid]" = WeakKeyDictionary()
 
-def _cell_label(job: Optional[Dict], maxlen: int = 12) -> str:
+def week_grid(timeline: Timeline) -> WeekGrid:
+    """Return the `WeekGrid` of `timeline`, built once per timeline."""
+    grid = _GRIDS.get(timeline)
+    if grid is None:
+        grid = _GRIDS[timeline] = WeekGrid(timeline)
+    return grid
+
+def _check_resolution(interval_minutes: Optional[int]) -> int:
+    if interval_minutes is None:
+        interval_minutes = DEFAULT_INTERVAL
+    if not 1 <= interval_minutes <= MINUTES_PER_DAY:
+        raise ValueError(f"interval_minutes must be between 1 and {MINUTES_PER_DAY}")
+    return interval_minutes
+
+def _grid(intervals: List[Interval], timeline: Optional[Timeline]) -> WeekGrid:
+    return week_grid(timeline) if timeline is not None else WeekGrid(Timeline(intervals))
+
+def _cell_label(job: Optional[Interval], maxlen: int = 12) -> str:
     if not job:
         return "-" * min(3, maxlen)
-    emoji = job.get("status_emoji", "") or ""
-    text = job.get("status_text", "") or ""
-    pres = job.get("presence", "") or ""
+    emoji = job.status_emoji
+    text = job.status_text
+    pres = job.presence or ""
     label = emoji if emoji else (text if text else pres)
     label = label.replace(":", "") if label else ""
     label = label.strip()
@@ -82,17 +109,26 @@ def _cell_label(job: Optional[Dict], maxlen: int = 12) -> str:
         return label[: maxlen - 1] + "…"
     return label or "-"
 
-def render_week_calendar(intervals: List[Dict], interval_minutes: Optional[int] = None) -> str:
+def job_dict(job: Optional[Interval]) -> Optional[Dict[str, Any]]:
+    """The status a job sets, as JSON-ready data (None for no status)."""
+    if job is None:
+        return None
+    return {"presence": job.presence, "status_text": job.status_text, "status_emoji": job.status_emoji}
+
+def render_week_calendar(
+    intervals: List[Interval],
+    interval_minutes: Optional[int] = None,
+    timeline: Optional[Timeline] = None,
+    grid: Optional[WeekGrid] = None,
+) -> str:
     """
     Render a compact week calendar in interval_minutes increments: rows are 00:00, 00:XX, ...;
-    columns are Mon..Sun. Each cell shows a short label (emoji / status_text / presence).
+    columns are Mon..Sun. Each cell shows a short label (emoji / status_text / presence)
+    for the job active at the start of its slot.
+    Pass a precompiled `timeline` (or `grid`) to reuse the one built by the scheduler.
     """
-    if interval_minutes is None:
-        interval_minutes = DEFAULT_INTERVAL
-
-    # ensure interval nicely divides the day
-    if 24 * 60 % interval_minutes != 0:
-        raise ValueError("interval_minutes must divide 1440 (minutes per day) evenly")
+    interval_minutes = _check_resolution(interval_minutes)
+    grid = grid or _grid(intervals, timeline)
 
     col_width = 14
     time_col_width = 6
@@ -101,20 +137,142 @@ def render_week_calendar(intervals: List[Dict], interval_minutes: Optional[int]
         header += d.center(col_width)
     lines = [header, "-" * (time_col_width + col_width * 7)]
 
-    # rows per day based on chosen interval
-    rows_per_day = 24 * 60 // interval_minutes
-    for slot in range(rows_per_day):
-        total_minutes = slot * interval_minutes
-        hour = total_minutes // 60
-        minute = total_minutes % 60
-        time_label = f"{hour:02d}:{minute:02d}".rjust(time_col_width)
-        row = time_label
-        for wd in range(7):
-            job = _get_job_for_weekday_hour_min(intervals, wd, hour, minute)
-            cell = _cell_label(job, maxlen=col_width - 2)
-            row += cell.center(col_width)
-        lines.append(row)
+    # every job is labelled once; rows are then plain lookups
+    cells = [_cell_label(job, maxlen=col_width - 2).center(col_width) for job in grid.jobs]
+    for slot, row in enumerate(grid.rows(interval_minutes)):
+        time_label = format_minute(slot * interval_minutes).rjust(time_col_width)
+        lines.append(time_label + "".join([cells[job_id] for job_id in row]))
 
     lines.append("")  # blank line
     lines.append(f"Legend: cells show (emoji) or status_text or presence. Calendar uses {interval_minutes}-minute resolution.")
     return "\n".join(lines)
+
+def week_calendar_data(
+    intervals: List[Interval],
+    interval_minutes: Optional[int] = None,
+    timeline: Optional[Timeline] = None,
+    grid: Optional[WeekGrid] = None,
+) -> Dict[str, Any]:
+    """
+    Return the calendar as JSON-serialisable data: `jobs` lists the distinct
+    statuses (index 0 is null, no status), `cells[slot][day]` indexes into it
+    and `times` labels the slots.
+    """
+    interval_minutes = _check_resolution(interval_minutes)
+    grid = grid or _grid(intervals, timeline)
+    rows = grid.rows(interval_minutes)
+    return {
+        "resolution": interval_minutes,
+        "days": DAY_NAMES,
+        "times": [format_minute(slot * interval_minutes) for slot in range(len(rows))],
+        "jobs": [job_dict(job) for job in grid.jobs],
+        "cells": [list(row) for row in rows],
+    }
+
+def week_segments_data(
+    intervals: List[Interval],
+    interval_minutes: Optional[int] = 1,
+    timeline: Optional[Timeline] = None,
+    grid: Optional[WeekGrid] = None,
+) -> Dict[str, Any]:
+    """
+    Return the run-length encoded week: `segments` holds [start, end, job]
+    with minutes of the week (Monday 00:00 = 0, end exclusive) and an index
+    into `jobs`. Defaults to the exact, 1-minute schedule.
+    """
+    interval_minutes = _check_resolution(interval_minutes)
+    grid = grid or _grid(intervals, timeline)
+    return {
+        "resolution": interval_minutes,
+        "jobs": [job_dict(job) for job in grid.jobs],
+        "segments": [list(segment) for segment in grid.segments(interval_minutes)],
+    }
+
+def _column_runs(column: Sequence[int]) -> Dict[int, Tuple[int, int]]:
+    # slot -> (rowspan, job id) for the first slot of every run of equal cells
+    runs: Dict[int, Tuple[int, int]] = {}
+    first = 0
+    for slot in range(1, len(column) + 1):
+        if slot == len(column) or column[slot] != column[first]:
+            runs[first] = (slot - first, column[first])
+            first = slot
+    return runs
+
+def render_week_calendar_html(
+    intervals: List[Interval],
+    interval_minutes: Optional[int] = None,
+    timeline: Optional[Timeline] = None,
+    grid: Optional[WeekGrid] = None,
+) -> str:
+    """
+    Render the calendar as an HTML table. Consecutive slots with the same
+    status are merged into one cell with a rowspan; the full status is in
+    the cell's title.
+    """
+    interval_minutes = _check_resolution(interval_minutes)
+    grid = grid or _grid(intervals, timeline)
+
+    cells = []
+    for job_id, job in enumerate(grid.jobs):
+        label = html.escape(_cell_label(job))
+        if job is None:
+            cells.append(("", label))
+            continue
+        title = html.escape(" ".join(filter(None, (job.status_emoji, job.status_text, f"({job.presence})"))))
+        cells.append((f' class="job-{job_id}" title="{title}"', label))
+
+    runs = [_column_runs(grid.column(day, interval_minutes)) for day in range(7)]
+    slots = -(-MINUTES_PER_DAY // interval_minutes)
+    lines = [
+        '<table class="week-calendar">',
+        "<thead><tr><th></th>" + "".join(f"<th>{d}</th>" for d in DAY_NAMES) + "</tr></thead>",
+        "<tbody>",
+    ]
+    for slot in range(slots):
+        row = [f"<tr><th>{format_minute(slot * interval_minutes)}</th>"]
+        for day_runs in runs:
+            run = day_runs.get(slot)
+            if run is None:
+                continue
+            span, job_id = run
+            attrs, label = cells[job_id]
+            rowspan = f' rowspan="{span}"' if span > 1 else ""
+            row.append(f"<td{rowspan}{attrs}>{label}</td>")
+        row.append("</tr>")
+        lines.append("".join(row))
+    lines += ["</tbody>", "</table>"]
+    return "\n".join(lines)
+
+def _render_segments(intervals, interval_minutes, timeline, grid) -> str:
+    interval_minutes = _check_resolution(interval_minutes)
+    grid = grid or _grid(intervals, timeline)
+    lines = []
+    for start, end, job_id in grid.segments(interval_minutes):
+        job = grid.jobs[job_id]
+        status = " ".join(filter(None, (job.status_emoji, job.status_text, f"({job.presence})"))) if job else "-"
+        lines.append(f"{DAY_NAMES[start // MINUTES_PER_DAY]} {format_minute(start % MINUTES_PER_DAY)} - "
+                     f"{DAY_NAMES[end // MINUTES_PER_DAY % 7]} {format_minute(end % MINUTES_PER_DAY)}  {status}")
+    return "\n".join(lines)
+
+def render_calendar(
+    intervals: List[Interval],
+    interval_minutes: Optional[int] = None,
+    timeline: Optional[Timeline] = None,
+    fmt: Optional[str] = None,
+    grid: Optional[WeekGrid] = None,
+) -> str:
+    """
+    Render the week calendar as `fmt`: "text" (the table printed at startup),
+    "json" (see `week_calendar_data`), "html" or "segments" (one line per
+    run of the same status). Defaults to DEFAULT_FORMAT.
+    """
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt == "text":
+        return render_week_calendar(intervals, interval_minutes, timeline, grid)
+    if fmt == "json":
+        return json.dumps(week_calendar_data(intervals, interval_minutes, timeline, grid), ensure_ascii=False)
+    if fmt == "html":
+        return render_week_calendar_html(intervals, interval_minutes, timeline, grid)
+    if fmt == "segments":
+        return _render_segments(intervals, interval_minutes, timeline, grid)
+    raise ValueError(f"Unknown calendar format '{fmt}', expected one of: {', '.join(FORMATS)}")
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import marshal
+import os
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .config import (
+    ConfigError,
+    Interval,
+    parse_config,
+    parse_profile,
+    parse_profiles,
+    profile_files,
+    read_source,
+    validate_config,
+    validate_profiles,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the payload layout, the meaning of the Interval fields or the validation changes.
+CACHE_VERSION = 2
+
+_FIELDS = tuple(f.name for f in fields(Interval))
+_write_failed = False
+
+
+def cache_dir() -> str:
+    """
+    Directory holding compiled schedules: `SLACK_STATUS_CACHE_DIR`, else
+    `$XDG_CACHE_HOME/slack-status` (`~/.cache/slack-status` by default).
+    """
+    configured = os.environ.get("SLACK_STATUS_CACHE_DIR")
+    if configured:
+        return configured
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "slack-status")
+
+
+def _artifact_path(source: str) -> str:
+    key = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:32]
+    return os.path.join(cache_dir(), f"{key}.bin")
+
+
+def _pack(intervals: List[Interval]) -> List[Tuple[Any, ...]]:
+    return [tuple(getattr(i, name) for name in _FIELDS) for i in intervals]
+
+
+def _unpack(rows: List[Tuple[Any, ...]]) -> List[Interval]:
+    return [Interval(*row) for row in rows]
+
+
+def _read(source: str, digest: str) -> Optional[Any]:
+    try:
+        # marshal.loads on the whole buffer is several times faster than marshal.load(f)
+        with open(_artifact_path(source), "rb") as f:
+            version, stored, payload = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION or stored != digest:
+        return None
+    return payload
+
+
+def _write(source: str, digest: str, payload: Any) -> None:
+    global _write_failed
+    path = _artifact_path(source)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        # the payload contains the Slack token
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(marshal.dumps((CACHE_VERSION, digest, payload)))
+        os.replace(tmp, path)
+    except (OSError, ValueError) as e:
+        # ValueError: the YAML holds a type marshal cannot store (e.g. a date)
+        if not _write_failed:
+            logger.warning("Cannot write compiled schedule cache for %s: %s", source, e)
+            _write_failed = True
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def _compile(path: str, parse: Callable[[bytes, str], Any], validate: Callable[[Any], Any],
+             pack: Callable[[Any], Any], unpack: Callable[[Any], Any]) -> Tuple[Any, Any, bool]:
+    data = read_source(path)
+    digest = hashlib.sha256(data).hexdigest()
+    payload = _read(path, digest)
+    if payload is not None:
+        source, compiled = payload
+        return source, unpack(compiled), True
+    source = parse(data, path)
+    compiled = validate(source)
+    _write(path, digest, (source, pack(compiled)))
+    return source, compiled, False
+
+
+def compile_config(path: str = "config.yml") -> Tuple[Dict[str, Any], List[Interval], bool]:
+    """
+    Return (config, intervals, cached) for the config file at `path`.
+
+    The compiled intervals are stored next to the parsed config in the cache,
+    keyed by the SHA-256 of the file's bytes. If the file is unchanged since it
+    was last compiled, YAML parsing and validation are skipped and `cached` is
+    True. `SLACK_TOKEN` may have changed since then, so callers must still
+    check `get_slack_token`.
+    """
+    return _compile(path, parse_config, validate_config, _pack, _unpack)
+
+
+def compile_profile(path: str) -> Tuple[Dict[str, Any], List[Interval], bool]:
+    """
+    Return (profile, intervals, cached) for one file of a profiles directory.
+    """
+    def validate(profile: Dict[str, Any]) -> List[Interval]:
+        return validate_profiles([profile])[str(profile["user"])]
+
+    return _compile(path, parse_profile, validate, _pack, _unpack)
+
+
+class CompiledProfiles(NamedTuple):
+    profiles: List[Dict[str, Any]]
+    records: Dict[str, List[Interval]]
+    # profile file -> user, in directory mode
+    sources: Dict[str, str]
+    # number of files loaded from the cache
+    cached: int
+
+
+def compile_profiles(path: str) -> CompiledProfiles:
+    """
+    Cached counterpart of `load_profiles` + `validate_profiles`.
+    In directory mode every file is cached on its own, so changing one profile
+    only recompiles that file.
+    """
+    if not os.path.exists(path):
+        raise ConfigError(f"Profiles path '{path}' not found.")
+
+    if not os.path.isdir(path):
+        profiles, records, cached = _compile(
+            path,
+            parse_profiles,
+            validate_profiles,
+            lambda records: {user: _pack(r) for user, r in records.items()},
+            lambda rows: {user: _unpack(r) for user, r in rows.items()},
+        )
+        return CompiledProfiles(profiles, records, {}, int(cached))
+
+    profiles: List[Dict[str, Any]] = []
+    records: Dict[str, List[Interval]] = {}
+    sources: Dict[str, str] = {}
+    errors: List[str] = []
+    cached = 0
+    files = profile_files(path)
+    if not files:
+        errors.append("No user profiles found")
+    for file in files:
+        try:
+            profile, intervals, hit = compile_profile(file)
+        except ConfigError as e:
+            errors.append(str(e))
+            continue
+        user = str(profile["user"])
+        if user in records:
+            errors.append(f"Duplicate user '{user}'")
+            continue
+        profiles.append(profile)
+        records[user] = intervals
+        sources[os.path.abspath(file)] = user
+        cached += hit
+
+    if errors:
+        raise ConfigError("\\n".join(errors))
+    return CompiledProfiles(profiles, records, sources, cached)
@@ -1,37 +1,206 @@
 import os
+from dataclasses import dataclass
+from datetime import tzinfo
 from typing import Any, Dict, List, Optional
-import yaml
+from .utils import parse_time, parse_days, is_minute_in_range
 
 class ConfigError(Exception):
     """Custom exception for configuration errors."""
     pass
 
+@dataclass(frozen=True, slots=True)
+class Interval:
+    """
+    One validated `intervals` entry. Times are minutes after midnight and
+    `days` is a 7-bit mask (bit 0 = Monday).
+    """
+    start: int
+    days: int
+    presence: str = "auto"
+    status_text: str = ""
+    status_emoji: str = ""
+    range_start: Optional[int] = None
+    range_end: Optional[int] = None
+
+    @property
+    def has_range(self) -> bool:
+        return self.range_start is not None
+
+    def weekdays(self) -> List[int]:
+        """Weekday numbers (0=Monday) the interval is scheduled on."""
+        return [d for d in range(7) if self.days >> d & 1]
+
+    def runs_on(self, weekday: int) -> bool:
+        return bool(self.days >> weekday & 1)
+
+    def covers(self, minute: int) -> bool:
+        """True if `minute` of the day is inside the time_range (always True without one)."""
+        return not self.has_range or is_minute_in_range(minute, self.range_start, self.range_end)
+
+def _safe_loader(yaml):
+    # libyaml's C loader when PyYAML was built against it, else the pure-Python one
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def parse_config(data: bytes, path: str = "config.yml") -> Dict[str, Any]:
+    """
+    Parse the YAML bytes of a config file read from `path`.
+    """
+    # imported here so a start from the compiled schedule cache never loads PyYAML
+    import yaml
+
+    try:
+        return yaml.load(data, Loader=_safe_loader(yaml)) or {}
+    except yaml.YAMLError as e:
+        raise ConfigError(f"Config file '{path}' is not valid YAML: {e}")
+
+def read_source(path: str) -> bytes:
+    """
+    Return the raw bytes of the config file at `path`.
+    If the file does not exist, a `ConfigError` is raised.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise ConfigError(f"Config file '{path}' not found.")
+
 def load_config(path: str = "config.yml") -> Dict[str, Any]:
     """
     Load YAML configuration from `path`.
     If the file does not exist, a `ConfigError` is raised.
     """
+    return parse_config(read_source(path), path)
+
+def profile_files(directory: str) -> List[str]:
+    """
+    Return the paths of the YAML profile files in `directory`, sorted by name.
+    """
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if os.path.splitext(name)[1] in (".yml", ".yaml")
+    ]
+
+def load_profile(path: str) -> Dict[str, Any]:
+    """
+    Load a single profile file; its `user` defaults to the file name without extension.
+    """
+    return parse_profile(read_source(path), path)
+
+def parse_profile(data: bytes, path: str) -> Dict[str, Any]:
+    """
+    Parse the YAML bytes of the profile file read from `path`.
+    """
+    profile = parse_config(data, path)
+    profile.setdefault("user", os.path.splitext(os.path.basename(path))[0])
+    return profile
+
+def load_profiles(path: str) -> List[Dict[str, Any]]:
+    """
+    Load user profiles for multi-user mode from `path`.
+    `path` is either a directory of YAML files (one profile per file) or a
+    single file containing one YAML document per profile. Each profile has the
+    same shape as `config.yml`; its `user` key (defaulting to the file name or
+    document position) identifies it.
+    """
     if not os.path.exists(path):
-        raise ConfigError(f"Config file '{path}' not found.")
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+        raise ConfigError(f"Profiles path '{path}' not found.")
+
+    if os.path.isdir(path):
+        return [load_profile(f) for f in profile_files(path)]
+
+    with open(path, "rb") as f:
+        return parse_profiles(f.read(), path)
+
+def parse_profiles(data: bytes, path: str) -> List[Dict[str, Any]]:
+    """
+    Parse a multi-document profiles file read from `path`.
+    """
+    import yaml
+
+    profiles: List[Dict[str, Any]] = []
+    try:
+        docs = list(yaml.load_all(data, Loader=_safe_loader(yaml)))
+    except yaml.YAMLError as e:
+        raise ConfigError(f"Profiles file '{path}' is not valid YAML: {e}")
+    for i, doc in enumerate(docs):
+        if doc is None:
+            continue
+        if not isinstance(doc, dict):
+            raise ConfigError(f"Profile document {i} in '{path}' must be a mapping")
+        doc.setdefault("user", f"user-{i}")
+        profiles.append(doc)
+    return profiles
 
-def get_slack_token(config: Dict[str, Any]) -> Optional[str]:
+def get_slack_token(config: Dict[str, Any], use_env: bool = True) -> Optional[str]:
     """
     Return Slack token from environment variable or config dictionary.
-    Environment variable `SLACK_TOKEN` takes precedence.
+    Environment variable `SLACK_TOKEN` takes precedence unless `use_env` is False
+    (multi-user profiles each carry their own token).
     """
-    return os.environ.get("SLACK_TOKEN") or config.get("slack_token")
+    return (use_env and os.environ.get("SLACK_TOKEN")) or config.get("slack_token")
 
-def validate_config(config: Dict[str, Any]) -> None:
+def get_timezone(config: Dict[str, Any]) -> Optional[tzinfo]:
+    """
+    Return the `timezone` of a config or profile as a `ZoneInfo`, or None
+    to use the local time of the process.
+    Raises `ConfigError` for an unknown zone.
+    """
+    name = config.get("timezone")
+    if name is None:
+        return None
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+    try:
+        return ZoneInfo(str(name))
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ConfigError(f"Unknown timezone '{name}', expected an IANA name like 'Europe/Berlin'")
+
+def validate_profiles(profiles: List[Dict[str, Any]]) -> Dict[str, List[Interval]]:
+    """
+    Validate every profile loaded by `load_profiles` and raise a single
+    `ConfigError` listing the problems of all profiles.
+    Returns the `Interval` records of every user.
+    """
+    errors: List[str] = []
+    records: Dict[str, List[Interval]] = {}
+    seen = set()
+    if not profiles:
+        errors.append("No user profiles found")
+    for profile in profiles:
+        user = str(profile["user"])
+        if user in seen:
+            errors.append(f"Duplicate user '{user}'")
+        seen.add(user)
+        try:
+            records[user] = validate_config(profile, use_env=False)
+        except ConfigError as e:
+            errors.extend(f"user '{user}': {line}" for line in str(e).split("\\n"))
+
+    if errors:
+        raise ConfigError("\\n".join(errors))
+    return records
+
+def _minutes(value: Any) -> int:
+    t = parse_time(value)
+    return t.hour * 60 + t.minute
+
+def validate_config(config: Dict[str, Any], use_env: bool = True) -> List[Interval]:
     """
     Validate `config` and raise `ConfigError` if invalid.
+    Returns the intervals as `Interval` records, in configuration order.
     """
     errors: List[str] = []
+    records: List[Interval] = []
 
-    if not get_slack_token(config):
+    if not get_slack_token(config, use_env=use_env):
         errors.append("Missing Slack token: set SLACK_TOKEN or add 'slack_token' to config.yml")
 
+    try:
+        get_timezone(config)
+    except ConfigError as e:
+        errors.append(str(e))
+
     intervals = config.get("intervals")
     if intervals is None:
         errors.append("Missing 'intervals' section in config.yml")
@@ -42,50 +211,71 @@ def validate_config(config: Dict[str, Any]) -> None:
             if not isinstance(item, dict):
                 errors.append(f"intervals[{i}] must be a mapping")
                 continue
-            
+            valid = True
+            start = days = 0
+            range_start = range_end = None
+
             # Validate time field
             if "time" not in item:
                 errors.append(f"intervals[{i}] missing required 'time' (HH:MM)")
+                valid = False
             else:
                 try:
-                    from .utils import parse_time
-                    parse_time(item["time"])
-                except ValueError:
+                    start = _minutes(item["time"])
+                except (ValueError, TypeError):
                     errors.append(f"intervals[{i}].time has invalid format, expected HH:MM")
-            
+                    valid = False
+
             # Validate days field (required)
             if "days" not in item:
                 errors.append(f"intervals[{i}] missing required 'days' field")
+                valid = False
             else:
                 try:
-                    from .utils import parse_days
-                    parse_days(item["days"])
+                    for day in parse_days(item["days"]):
+                        days |= 1 << day
                 except ValueError as e:
                     errors.append(f"intervals[{i}].days: {e}")
-            
+                    valid = False
+
             # Validate time_range field (optional)
             if "time_range" in item:
                 time_range = item["time_range"]
                 if not isinstance(time_range, dict):
                     errors.append(f"intervals[{i}].time_range must be a mapping with 'start' and 'end'")
+                    valid = False
                 else:
                     if "start" not in time_range:
                         errors.append(f"intervals[{i}].time_range missing required 'start' (HH:MM)")
+                        valid = False
                     else:
                         try:
-                            from .utils import parse_time
-                            parse_time(time_range["start"])
-                        except ValueError:
+                            range_start = _minutes(time_range["start"])
+                        except (ValueError, TypeError):
                             errors.append(f"intervals[{i}].time_range.start has invalid format, expected HH:MM")
-                    
+                            valid = False
+
                     if "end" not in time_range:
                         errors.append(f"intervals[{i}].time_range missing required 'end' (HH:MM)")
+                        valid = False
                     else:
                         try:
-                            from .utils import parse_time
-                            parse_time(time_range["end"])
-                        except ValueError:
+                            range_end = _minutes(time_range["end"])
+                        except (ValueError, TypeError):
                             errors.append(f"intervals[{i}].time_range.end has invalid format, expected HH:MM")
+                            valid = False
+
+            if valid:
+                records.append(Interval(
+                    start=start,
+                    days=days,
+                    presence=item.get("presence", "auto"),
+                    status_text=item.get("status_text", "") or "",
+                    status_emoji=item.get("status_emoji", "") or "",
+                    range_start=range_start,
+                    range_end=range_end,
+                ))
 
     if errors:
         raise ConfigError("\\n".join(errors))
+    return records
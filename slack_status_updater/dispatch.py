@@ -0,0 +1,265 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from .metrics import QUEUE_DEPTH, SCHEDULER_LAG
+from .slack import AppliedState, LazySlackUpdater
+
+logger = logging.getLogger(__name__)
+
+# Sustained requests per minute Slack allows per token for each method
+# (users.setPresence is Tier 2, users.profile.set is Tier 3).
+METHOD_RATES = {
+    "users.setPresence": 20,
+    "users.profile.set": 50,
+}
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, at most `capacity` stored.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, per_minute: float, capacity: float = 5.0):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float) -> None:
+        """Make the next token available no earlier than `seconds` from now."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Update:
+    __slots__ = ("token", "updater", "presence", "text", "emoji", "expiration", "seq", "due", "attempts")
+
+    def __init__(self, token: str, updater: LazySlackUpdater, presence: str, text: str, emoji: str, seq: int,
+                 due: Optional[float] = None, expiration: int = 0):
+        self.token = token
+        self.updater = updater
+        self.presence = presence
+        self.text = text
+        self.emoji = emoji
+        self.expiration = expiration
+        self.seq = seq
+        self.due = due
+        self.attempts = 0
+
+    def methods(self) -> List[str]:
+        """Slack methods this update still has to call, judging by the applied-state cache."""
+        applied = self.updater.applied
+        methods = []
+        if applied.presence != self.presence:
+            methods.append("users.setPresence")
+        if (self.text or self.emoji) and not applied.profile_matches(self.text, self.emoji, self.expiration):
+            methods.append("users.profile.set")
+        return methods
+
+
+class DispatchQueue:
+    """
+    Rate-limit-aware queue in front of `SlackUpdater`.
+
+    Every (method, token) pair has a token bucket sized after Slack's tier for
+    that method, and an update is only handed to a worker once all the calls it
+    needs fit in their buckets. A 429 pauses the bucket for `Retry-After`
+    seconds and re-queues the update with jitter; network and 5xx errors are
+    retried with exponential backoff up to `max_retries`. At most one update
+    per token is queued: a newer one supersedes the older, and updates for the
+    same token are never sent concurrently.
+    """
+
+    def __init__(self, workers: int = 4, max_retries: int = 5, jitter: float = 1.0):
+        self.max_retries = max_retries
+        self.jitter = jitter
+        self.sent = 0
+        self.retried = 0
+        self.superseded = 0
+        self.dropped = 0
+        self._pending: Dict[str, _Update] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._busy = set()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"slack-queue-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        QUEUE_DEPTH.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        """Number of updates waiting to be sent."""
+        return len(self._pending)
+
+    def submit(self, updater: LazySlackUpdater, presence: str, text: str = "", emoji: str = "",
+               due: Optional[float] = None, expiration: int = 0) -> None:
+        """
+        Queue a status update for the user behind `updater`, replacing any
+        update for the same token that has not been sent yet. `due` is the
+        planned instant of the transition, for the scheduler lag metric;
+        `expiration` is passed on as the status expiration.
+        """
+        token = updater.token
+        with self._cond:
+            if token in self._pending:
+                self.superseded += 1
+            update = _Update(token, updater, presence, text, emoji, next(self._seq), due, expiration)
+            self._pending[token] = update
+            heapq.heappush(self._heap, (time.monotonic(), update.seq, token))
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Stop the workers; updates still queued are dropped."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        if self._pending:
+            logger.warning("Dropped %d queued status updates on shutdown", len(self._pending))
+
+    def _bucket(self, method: str, token: str) -> TokenBucket:
+        bucket = self._buckets.get((method, token))
+        if bucket is None:
+            bucket = self._buckets[(method, token)] = TokenBucket(METHOD_RATES[method])
+        return bucket
+
+    def _next(self) -> Optional[_Update]:
+        """Block until an update may be sent and claim it. Called with the lock held."""
+        while not self._closed:
+            if not self._heap:
+                self._cond.wait()
+                continue
+            now = time.monotonic()
+            ready_at, seq, token = self._heap[0]
+            if ready_at > now:
+                self._cond.wait(ready_at - now)
+                continue
+            heapq.heappop(self._heap)
+
+            update = self._pending.get(token)
+            if update is None or update.seq != seq or token in self._busy:
+                # superseded, or the worker sending this token re-queues it when done
+                continue
+
+            methods = update.methods()
+            wait = max((self._bucket(m, token).delay(now) for m in methods), default=0.0)
+            if wait > 0:
+                heapq.heappush(self._heap, (now + wait, seq, token))
+                continue
+
+            for method in methods:
+                self._bucket(method, token).take(now)
+            del self._pending[token]
+            self._busy.add(token)
+            return update
+        return None
+
+    def _retry_delay(self, error: Exception, update: _Update) -> Optional[float]:
+        """Return seconds to wait before retrying `update`, or None to give up. Called with the lock held."""
+        now = time.monotonic()
+        if isinstance(error, SlackApiError):
+            response = error.response
+            if response.status_code == 429 or response.get("error") == "ratelimited":
+                headers = {k.lower(): v for k, v in (response.headers or {}).items()}
+                retry_after = float(headers.get("retry-after", 1))
+                method = response.api_url.rsplit("/", 1)[-1].split("?")[0]
+                if method in METHOD_RATES:
+                    self._bucket(method, update.token).pause(now, retry_after)
+                return retry_after + random.uniform(0, self.jitter)
+            if response.status_code < 500:
+                return None
+        if update.attempts >= self.max_retries:
+            return None
+        return min(60.0, 2.0 ** update.attempts) + random.uniform(0, self.jitter)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                update = self._next()
+            if update is None:
+                return
+
+            error: Optional[Exception] = None
+            try:
+                sent = update.updater.apply_status(
+                    presence=update.presence, text=update.text, emoji=update.emoji, expiration=update.expiration
+                )
+                if sent and update.due is not None:
+                    SCHEDULER_LAG.observe(time.time() - update.due)
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                token = update.token
+                self._busy.discard(token)
+                ready_at = time.monotonic()
+                if error is None:
+                    self.sent += 1
+                elif token not in self._pending:
+                    delay = self._retry_delay(error, update)
+                    if delay is None:
+                        self.dropped += 1
+                        logger.error("Dropping status update after error: %s", error)
+                    else:
+                        self.retried += 1
+                        update.attempts += 1
+                        self._pending[token] = update
+                        ready_at += delay
+                        logger.warning("Slack update failed (%s) - retrying in %.1fs", error, delay)
+                # a newer update may have been queued while this one was in flight
+                if token in self._pending:
+                    heapq.heappush(self._heap, (ready_at, self._pending[token].seq, token))
+                self._cond.notify_all()
+
+
+class QueuedSlackUpdater:
+    """
+    Per-user handle with the `SlackUpdater.set_status` interface that puts the
+    update on a shared `DispatchQueue`.
+    """
+    __slots__ = ("queue", "updater")
+
+    def __init__(self, queue: DispatchQueue, token: str, base_url: Optional[str] = None):
+        self.queue = queue
+        self.updater = LazySlackUpdater(token, base_url=base_url)
+
+    @property
+    def applied(self) -> AppliedState:
+        return self.updater.applied
+
+    @property
+    def saved_calls(self) -> int:
+        return self.updater.saved_calls
+
+    def seed_from_slack(self) -> None:
+        self.updater.seed_from_slack()
+
+    def set_status(self, presence: str, text: str = "", emoji: str = "", due: Optional[float] = None,
+                   expiration: int = 0) -> None:
+        self.queue.submit(self.updater, presence=presence, text=text, emoji=emoji, due=due, expiration=expiration)
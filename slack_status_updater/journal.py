@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from .slack import AppliedState
+
+logger = logging.getLogger(__name__)
+
+
+class Entry(NamedTuple):
+    """Status last applied for one Slack account; None fields were never set."""
+    presence: Optional[str]
+    text: Optional[str]
+    emoji: Optional[str]
+    at: float
+    # status_expiration the custom status was sent with, 0 = never
+    expires: int = 0
+
+
+def state_dir() -> str:
+    """
+    Directory holding the status journals: `SLACK_STATUS_STATE_DIR`, else
+    `$XDG_STATE_HOME/slack-status` (`~/.local/state/slack-status` by default).
+    """
+    configured = os.environ.get("SLACK_STATUS_STATE_DIR")
+    if configured:
+        return configured
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "slack-status")
+
+
+def journal_path(source: str, shard: Optional[str] = None) -> str:
+    """Journal file for the config or profiles at `source`, one per shard worker."""
+    key = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:32]
+    suffix = f"-{shard}" if shard else ""
+    return os.path.join(state_dir(), f"{key}{suffix}.journal")
+
+
+def account_key(token: str) -> str:
+    """Journal key of the Slack account behind `token`, without storing the token."""
+    return hashlib.sha256(token.encode()).hexdigest()[:24]
+
+
+def is_applied(applied: AppliedState, presence: str, text: str, emoji: str, expiration: int = 0) -> bool:
+    """
+    True if `applied` already matches the status, i.e. `set_status` would not
+    call Slack. Like the updaters, an empty text and emoji leave the custom
+    status alone.
+    """
+    if applied.presence != presence:
+        return False
+    return not (text or emoji) or applied.profile_matches(text, emoji, expiration)
+
+
+class StatusJournal:
+    """
+    Append-only record of the status last applied to every Slack account.
+
+    Each successful update appends one JSON line. A background thread writes
+    pending lines and fsyncs the file at most every `fsync_interval` seconds,
+    or as soon as `batch_size` lines are waiting, so a burst of updates costs
+    one fsync. A crash loses at most that window, and the affected accounts
+    are simply re-sent on the next start. When the file has grown to
+    `compact_ratio` lines per account (and at least `min_compact` lines), it
+    is rewritten with one line per account and atomically replaced.
+
+    On start, `attach` seeds an account's `AppliedState` from the journal, so
+    the initial status only goes out to accounts whose status is stale.
+    """
+    def __init__(
+        self,
+        path: str,
+        fsync_interval: float = 1.0,
+        batch_size: int = 256,
+        compact_ratio: int = 4,
+        min_compact: int = 1024,
+    ):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.compact_ratio = compact_ratio
+        self.min_compact = min_compact
+        self.entries: Dict[str, Entry] = {}
+        self._lines = 0
+        self._torn = False
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._failed = False
+        self._fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning("Cannot read status journal %s: %s", self.path, e)
+            return
+        # end a line torn by a crash before appending to it
+        self._torn = bool(data) and not data.endswith(b"\n")
+        for line in data.splitlines():
+            self._lines += 1
+            try:
+                record = json.loads(line)
+                if len(record) == 1:
+                    self.entries.pop(record[0], None)
+                else:
+                    key, *fields = record
+                    self.entries[key] = Entry(*fields)
+            except (ValueError, TypeError):
+                # a line torn by a crash mid-write; later lines are still good
+                continue
+
+    def attach(self, key: str, applied: AppliedState) -> Optional[Entry]:
+        """
+        Seed `applied` with the journaled status of account `key` and record
+        every status applied through it from now on. Returns the entry used.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            applied.presence, applied.text, applied.emoji = entry.presence, entry.text, entry.emoji
+            applied.expires = entry.expires
+        applied.on_commit = lambda state: self.record(key, state.presence, state.text, state.emoji, state.expires)
+        return entry
+
+    def record(
+        self, key: str, presence: Optional[str], text: Optional[str], emoji: Optional[str], expires: int = 0
+    ) -> None:
+        """Journal that `presence` and the custom status were applied to account `key` just now."""
+        entry = Entry(presence, text, emoji, time.time(), expires)
+        self._append(key, entry, json.dumps([key, *entry], ensure_ascii=False, separators=(",", ":")))
+
+    def forget(self, key: str) -> None:
+        """Drop account `key`, e.g. after its profile was removed."""
+        if key in self.entries:
+            self._append(key, None, json.dumps([key]))
+
+    def _append(self, key: str, entry: Optional[Entry], line: str) -> None:
+        with self._lock:
+            if self._closed or self._failed:
+                return
+            if entry is None:
+                self.entries.pop(key, None)
+            else:
+                self.entries[key] = entry
+            self._pending.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="status-journal", daemon=True)
+                self._thread.start()
+            elif len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.fsync_interval)
+                lines, self._pending = self._pending, []
+                closed = self._closed
+            if lines:
+                self._write(lines)
+            if closed:
+                return
+
+    def _write(self, lines: List[str]) -> None:
+        try:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                if self._torn:
+                    lines = ["", *lines]
+            os.write(self._fd, ("\n".join(lines) + "\n").encode())
+            os.fsync(self._fd)
+            self._lines += len(lines)
+            if self._lines >= max(self.min_compact, self.compact_ratio * len(self.entries)):
+                self._compact()
+        except OSError as e:
+            logger.warning("Cannot write status journal %s, journaling disabled: %s", self.path, e)
+            with self._lock:
+                self._failed = True
+
+    def _compact(self) -> None:
+        with self._lock:
+            # pending records are already reflected in the entries
+            lines = [json.dumps([key, *entry], ensure_ascii=False, separators=(",", ":"))
+                     for key, entry in self.entries.items()]
+            self._pending = []
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, ("\n".join(lines) + "\n").encode() if lines else b"")
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, self.path)
+        directory = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        logger.debug("Compacted status journal from %d to %d lines", self._lines, len(lines))
+        self._lines = len(lines)
+
+    def close(self) -> None:
+        """Write and fsync whatever is pending, then stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+REGISTRY: List["_Metric"] = []
+
+
+class _Metric:
+    """
+    Base of the metric types. Values are kept per tuple of label values, in
+    the order of `labelnames`. Recording is always on and costs a dict update
+    under a lock, so the hot paths do not need to know whether an exporter runs.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], float]] = None
+        REGISTRY.append(self)
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        """Report `function()` at collection time instead of the recorded value (unlabelled metrics only)."""
+        self._function = function
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[Sample]:
+        if self._function is not None:
+            yield self.name, {}, float(self._function())
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[Labels, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            # first bucket whose upper bound is >= value; the last slot is +Inf
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = [(labels, (list(counts), total)) for labels, (counts, total) in self._values.items()]
+        for labels, (counts, total) in values:
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", {**base, "le": le}, cumulative
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, cumulative
+
+
+API_LATENCY = Histogram(
+    "slack_status_api_request_duration_seconds",
+    "Duration of Slack Web API calls, including failed ones.",
+    ["method"],
+)
+API_ERRORS = Counter(
+    "slack_status_api_errors_total",
+    "Slack Web API calls that failed, by Slack error code or exception type (429s excluded).",
+    ["method", "error"],
+)
+API_RATELIMITED = Counter(
+    "slack_status_api_ratelimited_total",
+    "Slack Web API calls answered with HTTP 429.",
+    ["method"],
+)
+SKIPPED_CALLS = Counter(
+    "slack_status_skipped_calls_total",
+    "Slack calls not made because the status was already applied.",
+    ["method"],
+)
+SCHEDULER_LAG = Histogram(
+    "slack_status_scheduler_lag_seconds",
+    "Time from a transition's planned instant until its Slack write completed.",
+    buckets=LAG_BUCKETS,
+)
+TIMER_LAG = Histogram(
+    "slack_status_timer_lag_seconds",
+    "Time from a transition's planned instant until its timer callback started.",
+    buckets=LAG_BUCKETS,
+)
+COALESCED = Counter(
+    "slack_status_coalesced_transitions_total",
+    "Interval starts and time_range ends merged into another transition at the same instant.",
+)
+QUEUE_DEPTH = Gauge("slack_status_queue_depth", "Status updates waiting in the rate-limit queue.")
+IN_FLIGHT = Gauge("slack_status_in_flight_updates", "Status updates being sent by the async dispatcher.")
+TIMERS = Gauge("slack_status_timers", "Timers registered with the scheduler.")
+WAKEUPS = Counter("slack_status_timer_wakeups_total", "Times the scheduler loop woke up.")
+
+
+class slack_call:
+    """
+    Context manager timing one Slack API call and counting its failures.
+    Errors are recognised by their `response` (as on `SlackApiError`), so
+    slack_sdk does not have to be imported here.
+    """
+    __slots__ = ("method", "_started")
+
+    def __init__(self, method: str):
+        self.method = method
+
+    def __enter__(self) -> "slack_call":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        API_LATENCY.observe(time.perf_counter() - self._started, self.method)
+        if exc is not None:
+            response = getattr(exc, "response", None)
+            if getattr(response, "status_code", None) == 429:
+                API_RATELIMITED.inc(self.method)
+            else:
+                error = response.get("error") if hasattr(response, "get") else None
+                API_ERRORS.inc(self.method, str(error or exc_type.__name__))
+        return False
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """Return every registered metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            if labels:
+                rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                lines.append(f"{name}{{{rendered}}} {_format(value)}")
+            else:
+                lines.append(f"{name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port: int, addr: str = ""):
+    """Serve `/metrics` from a daemon thread and return the server."""
+    # http.server pulls in the email package (~40ms), so it is only imported when serving
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            data = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", addr or "0.0.0.0", server.server_address[1])
+    return server
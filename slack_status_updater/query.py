@@ -0,0 +1,278 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+from weakref import WeakKeyDictionary
+
+from . import calendar
+from .metrics import Counter
+from .timeline import MINUTES_PER_DAY, Timeline, minute_of_week
+
+logger = logging.getLogger(__name__)
+
+QUERY_REQUESTS = Counter(
+    "slack_status_query_requests_total",
+    "Requests to the status query API, by endpoint and HTTP status.",
+    ["endpoint", "code"],
+)
+
+CONTENT_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "json": "application/json",
+    "html": "text/html; charset=utf-8",
+    "segments": "text/plain; charset=utf-8",
+}
+
+# (HTTP status, headers, body)
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class QueryError(Exception):
+    """A request the API cannot answer, with the HTTP status to send."""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+_DIGESTS: "WeakKeyDictionary[Timeline, str]" = WeakKeyDictionary()
+
+def schedule_digest(scheduler) -> str:
+    """
+    Short hash of a scheduler's compiled schedule and timezone, computed once
+    per timeline. A reload that changes the schedule builds a new timeline,
+    so the digest (and every ETag derived from it) changes with it.
+    """
+    timeline = scheduler.timeline
+    digest = _DIGESTS.get(timeline)
+    if digest is None:
+        source = repr((timeline.intervals, str(scheduler.tz) if scheduler.tz else None)).encode()
+        digest = _DIGESTS[timeline] = hashlib.blake2b(source, digest_size=8).hexdigest()
+    return digest
+
+
+class RenderCache:
+    """
+    LRU cache of rendered calendars, keyed by user and rendering options.
+    Every entry remembers the schedule digest it was rendered from and is
+    not served once the user's schedule has another digest, so a reload
+    invalidates exactly the calendars of the users it changed. Stale
+    entries are replaced on the next request or age out.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Any, ...], digest: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != digest:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[Any, ...], digest: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (digest, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class StatusQueries:
+    """
+    Answers the read-only query API from the schedulers' compiled timelines,
+    with the same resolution as `Scheduler.get_current_job`. Nothing here
+    touches Slack or the YAML files.
+
+    `lookup(user)` returns the scheduler of a user, or None for an unknown
+    user (404); in single-user mode the only user is None. `users()` lists
+    the users.
+
+        GET /users
+        GET /status?user=U&at=2026-10-19T09:30      status at a time (default: now)
+        GET /segments?user=U                          the week as [start, end, job] minutes
+        GET /calendar?user=U&format=html&interval=30  rendered like the startup calendar
+
+    Naive `at` times are read in the user's timezone. Every response
+    carries an ETag derived from the user's schedule; a matching
+    If-None-Match gets a 304. Until `ready()` is true, e.g. while the
+    schedules are still being loaded at startup, every request gets a 503.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[Optional[str]], Any],
+        users: Callable[[], Sequence[str]],
+        cache: Optional[RenderCache] = None,
+        ready: Optional[Callable[[], bool]] = None,
+    ):
+        self.lookup = lookup
+        self.users = users
+        self.cache = cache if cache is not None else RenderCache()
+        self.ready = ready
+
+    def handle(self, target: str, if_none_match: Optional[str] = None) -> Response:
+        """Answer one GET request for `target` (path and query string)."""
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip("/") or "/"
+        handler = {
+            "/users": self._users,
+            "/status": self._status,
+            "/segments": self._segments,
+            "/calendar": self._calendar,
+        }.get(endpoint)
+        try:
+            if handler is None:
+                raise QueryError(404, f"Unknown endpoint '{url.path}'")
+            if self.ready is not None and not self.ready():
+                raise QueryError(503, "Schedules are still loading")
+            etag, content_type, body = handler(params, if_none_match)
+        except QueryError as e:
+            QUERY_REQUESTS.inc(endpoint if handler else "other", str(e.status))
+            headers = {"Content-Type": CONTENT_TYPES["json"]}
+            if e.status == 503:
+                headers["Retry-After"] = "1"
+            return e.status, headers, _json({"error": str(e)})
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if body is None:
+            QUERY_REQUESTS.inc(endpoint, "304")
+            return 304, headers, b""
+        QUERY_REQUESTS.inc(endpoint, "200")
+        headers["Content-Type"] = content_type
+        return 200, headers, body
+
+    def _scheduler(self, params: Dict[str, str]) -> Tuple[Optional[str], Any]:
+        user = params.get("user")
+        scheduler = self.lookup(user)
+        if scheduler is None:
+            if user is None:
+                raise QueryError(400, "Missing 'user' parameter")
+            raise QueryError(404, f"Unknown user '{user}'")
+        return user, scheduler
+
+    def _users(self, params: Dict[str, str], if_none_match: Optional[str]):
+        body = _json({"users": list(self.users())})
+        etag = _etag(hashlib.blake2b(body, digest_size=8).hexdigest())
+        return etag, CONTENT_TYPES["json"], None if _matches(if_none_match, etag) else body
+
+    def _status(self, params: Dict[str, str], if_none_match: Optional[str]):
+        user, scheduler = self._scheduler(params)
+        tz = scheduler.tz
+        if "at" in params:
+            try:
+                at = datetime.fromisoformat(params["at"])
+            except ValueError:
+                raise QueryError(400, f"Invalid 'at' time '{params['at']}', expected ISO 8601")
+            at = at.replace(tzinfo=tz) if at.tzinfo is None and tz is not None else at
+            if at.tzinfo is not None:
+                at = at.astimezone(tz) if tz is not None else at.astimezone().replace(tzinfo=None)
+        else:
+            at = datetime.now(tz)
+
+        timeline = scheduler.timeline
+        minute = minute_of_week(at)
+        job = timeline.job_at(minute)
+        until = at.replace(second=0, microsecond=0) + timedelta(minutes=timeline.next_transition(minute) - minute)
+        data = {
+            "user": user,
+            "timezone": str(tz) if tz is not None else None,
+            "status": calendar.job_dict(job),
+            "until": until.isoformat(timespec="minutes"),
+        }
+        # "now" is left out, so polling the current status revalidates until the next transition
+        if "at" in params:
+            data["at"] = at.isoformat(timespec="seconds")
+        body = _json(data)
+        etag = _etag(f"{schedule_digest(scheduler)}-{hashlib.blake2b(body, digest_size=6).hexdigest()}")
+        return etag, CONTENT_TYPES["json"], None if _matches(if_none_match, etag) else body
+
+    def _segments(self, params: Dict[str, str], if_none_match: Optional[str]):
+        return self._render(params, if_none_match, "segments-json", 1)
+
+    def _calendar(self, params: Dict[str, str], if_none_match: Optional[str]):
+        fmt = params.get("format", "json")
+        if fmt not in calendar.FORMATS:
+            raise QueryError(400, f"Unknown format '{fmt}', expected one of: {', '.join(calendar.FORMATS)}")
+        try:
+            resolution = int(params.get("interval", calendar.DEFAULT_INTERVAL))
+        except ValueError:
+            raise QueryError(400, "'interval' must be a number of minutes")
+        if not 1 <= resolution <= MINUTES_PER_DAY:
+            raise QueryError(400, f"'interval' must be between 1 and {MINUTES_PER_DAY}")
+        return self._render(params, if_none_match, fmt, resolution)
+
+    def _render(self, params: Dict[str, str], if_none_match: Optional[str], fmt: str, resolution: int):
+        user, scheduler = self._scheduler(params)
+        digest = schedule_digest(scheduler)
+        etag = _etag(f"{digest}-{fmt}-{resolution}")
+        content_type = CONTENT_TYPES["json" if fmt == "segments-json" else fmt]
+        # a revalidation with a current ETag needs no rendering at all
+        if _matches(if_none_match, etag):
+            return etag, content_type, None
+
+        key = (user, fmt, resolution)
+        body = self.cache.get(key, digest)
+        if body is None:
+            timeline = scheduler.timeline
+            if fmt == "segments-json":
+                data = calendar.week_segments_data(timeline.intervals, resolution, timeline=timeline)
+                body = _json({"user": user, "timezone": str(scheduler.tz) if scheduler.tz else None, **data})
+            else:
+                body = calendar.render_calendar(timeline.intervals, resolution, timeline=timeline, fmt=fmt).encode()
+            self.cache.put(key, digest, body)
+        return etag, content_type, body
+
+
+def _json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _etag(value: str) -> str:
+    return f'"{value}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+def start_query_server(queries: StatusQueries, port: int, addr: str = ""):
+    """Serve `queries` over HTTP from a daemon thread and return the server."""
+    # imported here for the same reason as in metrics.start_http_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive, so a dashboard polling many users reuses its connection;
+        # without TCP_NODELAY the separate header and body writes stall on delayed ACKs
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            status, headers, body = queries.handle(self.path, self.headers.get("If-None-Match"))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="query-api", daemon=True).start()
+    logger.info("Serving the status query API on http://%s:%d/", addr or "0.0.0.0", server.server_address[1])
+    return server
@@ -1,131 +1,311 @@
 import logging
-import time
-from typing import Any, Dict, List, Optional
-
-import schedule
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
+from .config import Interval
+from .metrics import COALESCED
 from .slack import SlackUpdater
-from .utils import parse_time, parse_days, is_time_in_range, is_day_match
-from datetime import datetime
+from .timeline import Timeline, MINUTES_PER_DAY, minute_of_week
+from .timers import DAY_ATTRS, TimerHeap
+from .utils import format_minute
+from datetime import datetime, timedelta, tzinfo
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
 
+class _Transition:
+    """Every start and time_range end of one user at one minute of the week."""
+    __slots__ = ("minute", "starts", "ends", "timer")
+
+    def __init__(self, minute: int):
+        self.minute = minute
+        # id() of the interval -> interval
+        self.starts: Dict[int, Interval] = {}
+        # id() of the intervals whose time_range ends here
+        self.ends: Set[int] = set()
+        self.timer: Any = None
+
+
 class Scheduler:
-    def __init__(self, updater: SlackUpdater, intervals: List[Dict[str, Any]]):
+    """
+    Sets the status of one user at the transitions of their schedule.
+
+    With `use_expiration`, a status that is followed by "nothing active" is
+    sent with a Slack `status_expiration` at the end of its segment, and the
+    time_range end timers that would only clear it are not registered.
+
+    Starts and range ends at the same minute share one timer, which resolves
+    the winning state through the timeline and writes it once, so the status
+    does not flap through the intermediate ones.
+
+    The schedule runs on the wall clock of `tz` (a `ZoneInfo`), or on the
+    local time of the process when it is None. `clock` returns the current
+    time in that zone. It defaults to `datetime.now(tz)`; the simulator
+    passes the virtual clock of its timer backend.
+    """
+    def __init__(
+        self,
+        updater: SlackUpdater,
+        intervals: List[Interval],
+        timers=None,
+        user: Optional[str] = None,
+        use_expiration: bool = False,
+        tz: Optional[tzinfo] = None,
+        clock: Optional[Callable[[], datetime]] = None,
+    ):
         self.updater = updater
-        self.intervals = sorted(intervals, key=lambda j: parse_time(j["time"]))
+        self.tz = tz
+        self.clock = clock or (datetime.now if tz is None else partial(datetime.now, tz))
+        self.user = user
+        self.use_expiration = use_expiration
+        # per-timer scheduling lines are noise when one process drives many users
+        self._log_level = logging.INFO if user is None else logging.DEBUG
+        self.intervals = sorted(intervals, key=lambda j: j.start)
+        self.timeline = Timeline(self.intervals)
+        self.timers = timers if timers is not None else TimerHeap()
+        self.timers.on_clock_jump.append(self._on_clock_jump)
+        # transition handles per scheduled interval, keyed by id() of the record
+        self._handles: Dict[int, List[Tuple[int, bool, int]]] = {}
+        # one timer per minute of the week with any start or range end
+        self._transitions: Dict[int, _Transition] = {}
+        # starts/range ends folded into another one at the same instant
+        self.coalesced = 0
+        self._scheduled = False
 
-    def _is_interval_active(self, interval: Dict[str, Any], current_time: datetime) -> bool:
+    def _is_interval_active(self, interval: Interval, current_time: datetime) -> bool:
         """Check if an interval should be active at the current time."""
-        # Check day constraints (now required)
-        allowed_days = parse_days(interval["days"])
-        if not is_day_match(current_time.weekday(), allowed_days):
+        if not interval.runs_on(current_time.weekday()):
             return False
-        
-        # Check time range constraints
-        if "time_range" in interval:
-            time_range = interval["time_range"]
-            start_time = parse_time(time_range["start"])
-            end_time = parse_time(time_range["end"])
-            if not is_time_in_range(current_time.time(), start_time, end_time):
-                return False
-        
-        return True
+        return interval.covers(current_time.hour * 60 + current_time.minute)
 
-    def get_current_job(self) -> Optional[Dict[str, Any]]:
+    def get_current_job(self) -> Optional[Interval]:
         """Return the interval (job) that matches the current time."""
-        now = datetime.now()
-        
         if not self.intervals:
             raise ValueError("No intervals configured")
 
-        # Filter intervals that are active for current day/time constraints
-        active_intervals = [job for job in self.intervals if self._is_interval_active(job, now)]
-        
-        if not active_intervals:
-            # If no intervals are active, return None to indicate no status should be set
-            return None
-
-        # Find the active interval that matches current time
-        for i, job in enumerate(active_intervals):
-            start_time = parse_time(job["time"])
-            next_job = active_intervals[(i + 1) % len(active_intervals)]
-            end_time = parse_time(next_job["time"])
-
-            if start_time <= end_time:
-                if start_time <= now.time() < end_time:
-                    return job
-            else:
-                if now.time() >= start_time or now.time() < end_time:
-                    return job
-        
-        return active_intervals[-1] if active_intervals else None
-
-    def _schedule_interval_job(self, interval: Dict[str, Any]) -> None:
-        """Schedule a specific interval job with day constraints."""
-        job_time = interval["time"]
-        
-        def status_update_job():
-            # Double-check if the job should run at execution time
-            if self._is_interval_active(interval, datetime.now()):
-                self.updater.set_status(
-                    presence=interval.get("presence", "auto"),
-                    text=interval.get("status_text", ""),
-                    emoji=interval.get("status_emoji", ""),
-                )
-            else:
-                logger.debug(f"Skipping job at {job_time} - not active for current day/time constraints")
-        
-        def time_range_end_job():
-            """Job that runs when a time range expires to switch to next appropriate status."""
-            current_job = self.get_current_job()
-            if current_job:
-                self.updater.set_status(
-                    presence=current_job.get("presence", "auto"),
-                    text=current_job.get("status_text", ""),
-                    emoji=current_job.get("status_emoji", ""),
-                )
-                logger.info(f"Time range expired - switched to status: '{current_job.get('status_text', '')}'")
-            else:
-                # No active status found - clear the status
-                self.updater.set_status(presence="auto", text="", emoji="")
-                logger.info("Time range expired - cleared status (no active intervals)")
-        
+        return self.timeline.job_at_time(self.clock())
+
+    def status_expiration(self, now: Optional[datetime] = None) -> int:
+        """
+        Return the `status_expiration` (epoch seconds) for the status active
+        at `now`: the end of its segment if no status follows it, else 0
+        (never). Always 0 without `use_expiration`.
+        """
+        if not self.use_expiration:
+            return 0
+        now = now or self.clock()
+        minute = minute_of_week(now)
+        end = self.timeline.next_transition(minute)
+        if self.timeline.job_at(end) is not None:
+            return 0
+        return int((now.replace(second=0, microsecond=0) + timedelta(minutes=end - minute)).timestamp())
+
+    def _expires_by_itself(self, minute: int) -> bool:
+        """
+        True if the transition at `minute` of the week only clears the status,
+        which Slack already does through the status expiration, and leaves
+        the presence at "auto".
+        """
+        if not self.use_expiration or self.timeline.job_at(minute) is not None:
+            return False
+        before = self.timeline.job_at(minute - 1)
+        return before is None or before.presence == "auto"
+
+    def _run_transition(self, transition: "_Transition") -> None:
+        """
+        Timer callback for every start and range end at one instant: resolve
+        the state that wins now through the timeline and write it once.
+        """
+        merged = len(transition.starts) + len(transition.ends) - 1
+        if merged:
+            self.coalesced += merged
+            COALESCED.inc(amount=merged)
+        now = self.clock()
+        # a start outside its time_range is skipped, as it would be on its own
+        if not transition.ends and not any(self._is_interval_active(i, now) for i in transition.starts.values()):
+            logger.debug(
+                "Skipping jobs at %s - not active for current day/time constraints",
+                format_minute(transition.minute % MINUTES_PER_DAY),
+            )
+            return
+
+        current_job = self.timeline.job_at_time(now)
+        if current_job:
+            self.updater.set_status(
+                presence=current_job.presence,
+                text=current_job.status_text,
+                emoji=current_job.status_emoji,
+                due=self.timers.firing_at,
+                expiration=self.status_expiration(now),
+            )
+            if transition.ends:
+                logger.info(f"Time range expired - switched to status: '{current_job.status_text}'")
+        else:
+            # a time range expired and nothing else is active - clear the status
+            self.updater.set_status(presence="auto", text="", emoji="", due=self.timers.firing_at)
+            logger.info("Time range expired - cleared status (no active intervals)")
+
+    def _join(self, minute: int, interval: Interval, end: bool) -> Tuple[int, bool, int]:
+        """
+        Add a start (or range end) of `interval` to the transition at `minute`
+        of the week, registering its timer on first use. Returns the handle.
+        """
+        transition = self._transitions.get(minute)
+        if transition is None:
+            transition = self._transitions[minute] = _Transition(minute)
+            transition.timer = self.timers.add(minute, lambda: self._run_transition(transition), tz=self.tz)
+        if end:
+            transition.ends.add(id(interval))
+        else:
+            transition.starts[id(interval)] = interval
+        return minute, end, id(interval)
+
+    def _leave(self, handle: Tuple[int, bool, int]) -> None:
+        """Remove a start or range end; the timer goes with the last one at its instant."""
+        minute, end, key = handle
+        transition = self._transitions.get(minute)
+        if transition is None:
+            return
+        if end:
+            transition.ends.discard(key)
+        else:
+            transition.starts.pop(key, None)
+        if not transition.starts and not transition.ends:
+            self.timers.cancel(transition.timer)
+            del self._transitions[minute]
+
+    def _schedule_interval_job(self, interval: Interval) -> List[Tuple[int, bool, int]]:
+        """Schedule a specific interval job with day constraints and return its transition handles."""
+        job_time = format_minute(interval.start)
+        handles: List[Tuple[int, bool, int]] = []
+
         # Schedule for specific days
-        allowed_days = parse_days(interval["days"])
-        day_map = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-        
-        for day_num in allowed_days:
-            day_name = day_map[day_num]
-            getattr(schedule.every(), day_name).at(job_time).do(status_update_job)
-            logger.info(
+        for day_num in interval.weekdays():
+            day_name = DAY_ATTRS[day_num]
+            handles.append(self._join(day_num * MINUTES_PER_DAY + interval.start, interval, end=False))
+            logger.log(
+                self._log_level,
                 "Scheduled %s on %s at %s with '%s' %s",
-                interval.get("presence", "auto"),
+                interval.presence,
                 day_name,
                 job_time,
-                interval.get("status_text", ""),
-                interval.get("status_emoji", ""),
+                interval.status_text,
+                interval.status_emoji,
             )
-            
+
             # If this interval has a time_range, also schedule a job when it expires
-            if "time_range" in interval:
-                end_time = interval["time_range"]["end"]
-                getattr(schedule.every(), day_name).at(end_time).do(time_range_end_job)
-                logger.info(
+            if interval.has_range:
+                range_end = day_num * MINUTES_PER_DAY + interval.range_end
+                if self._expires_by_itself(range_end):
+                    logger.log(
+                        self._log_level,
+                        "Time range end on %s at %s left to the status expiration",
+                        day_name,
+                        format_minute(interval.range_end),
+                    )
+                    continue
+                handles.append(self._join(range_end, interval, end=True))
+                logger.log(
+                    self._log_level,
                     "Scheduled time range end job on %s at %s",
                     day_name,
-                    end_time,
+                    format_minute(interval.range_end),
                 )
 
+        return handles
+
     def schedule_jobs(self) -> None:
         """Schedule all status updates."""
         for interval in self.intervals:
-            self._schedule_interval_job(interval)
+            self._handles[id(interval)] = self._schedule_interval_job(interval)
+        self._scheduled = True
+        transitions = sum(len(handles) for handles in self._handles.values())
+        if transitions > len(self._transitions):
+            logger.log(
+                self._log_level,
+                "Coalesced %d transitions into %d timers",
+                transitions,
+                len(self._transitions),
+            )
+
+    def cancel_jobs(self) -> None:
+        """Cancel every timer of this scheduler, e.g. when its user is removed."""
+        for transition in self._transitions.values():
+            self.timers.cancel(transition.timer)
+        self._transitions.clear()
+        self._handles.clear()
+        self._scheduled = False
+        if self._on_clock_jump in self.timers.on_clock_jump:
+            self.timers.on_clock_jump.remove(self._on_clock_jump)
+
+    def update_intervals(self, intervals: List[Interval]) -> bool:
+        """
+        Replace the configured intervals with `intervals`, touching only the
+        timers of intervals that were added or removed. The status is
+        re-applied only if the job active right now, or the expiration it
+        is sent with, changed. Returns True if it was re-applied.
+        """
+        before = self.get_current_job()
+        # a status sent without expiration because a follower was removed would never be cleared
+        expiration_before = self.status_expiration()
+
+        # reuse the existing records for unchanged intervals so their timers stay valid
+        pool: Dict[Interval, List[Interval]] = {}
+        for interval in self.intervals:
+            pool.setdefault(interval, []).append(interval)
+        merged: List[Interval] = []
+        added: List[Interval] = []
+        for interval in intervals:
+            same = pool.get(interval)
+            if same:
+                merged.append(same.pop(0))
+            else:
+                merged.append(interval)
+                added.append(interval)
+        removed = [interval for same in pool.values() for interval in same]
+        # whether a range end is left to Slack depends on the whole schedule
+        rescheduled = []
+        if self.use_expiration and self._scheduled:
+            new = {id(interval) for interval in added}
+            rescheduled = [i for i in merged if i.has_range and id(i) not in new]
+
+        for interval in removed + rescheduled:
+            for handle in self._handles.pop(id(interval), []):
+                self._leave(handle)
+        self.intervals = sorted(merged, key=lambda j: j.start)
+        self.timeline = Timeline(self.intervals)
+        if self._scheduled:
+            for interval in added + rescheduled:
+                self._handles[id(interval)] = self._schedule_interval_job(interval)
+
+        logger.info("Schedule reloaded: %d intervals added, %d removed", len(added), len(removed))
+        if before == self.get_current_job() and expiration_before == self.status_expiration():
+            return False
+        self.apply_current_job("Schedule reloaded")
+        return True
+
+    def apply_current_job(self, reason: str) -> Optional[Interval]:
+        """Set the status that should be active now and return its job."""
+        current_job = self.get_current_job()
+        if current_job:
+            self.updater.set_status(
+                presence=current_job.presence,
+                text=current_job.status_text,
+                emoji=current_job.status_emoji,
+                expiration=self.status_expiration(),
+            )
+            logger.info("%s - applied status: '%s'", reason, current_job.status_text)
+        return current_job
+
+    def _on_clock_jump(self) -> None:
+        """Re-apply the status that should be active now after the wall clock jumped."""
+        self.apply_current_job("Clock jump")
 
     def run_forever(self) -> None:
-        """Run the scheduler indefinitely."""
+        """Run the scheduler until its timers are stopped."""
         logger.info("Scheduler running...")
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        self.timers.run_forever()
+
+    def stop(self) -> None:
+        """Stop the scheduler loop; safe to call from a signal handler."""
+        self.timers.stop()
@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import multiprocessing
+import signal
+import time
+from bisect import bisect_right
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys (user ids) to nodes (shards).
+
+    Every node is placed on the ring `replicas` times, and a key belongs to
+    the first node point at or after its own hash. Adding or removing a node
+    only moves the keys on the arcs that node takes over or gives up, about
+    1/N of them; every other key keeps its node.
+    """
+    def __init__(self, nodes: Sequence[str] = (), replicas: int = 160):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            idx = bisect_right(self._points, point)
+            self._points.insert(idx, point)
+            self._owners.insert(idx, node)
+
+    def remove(self, node: str) -> None:
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("The hash ring has no nodes")
+        return self._owners[bisect_right(self._points, _hash(key)) % len(self._points)]
+
+
+class ShardFilter:
+    """
+    Picklable predicate telling whether shard `index` of `count` owns a user.
+    Every worker builds the same ring, so they agree on ownership without
+    talking to each other.
+    """
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+        self._ring: Optional[HashRing] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"index": self.index, "count": self.count}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["index"], state["count"])
+
+    def __call__(self, user: str) -> bool:
+        if self._ring is None:
+            self._ring = HashRing([shard_name(n) for n in range(self.count)])
+        return self._ring.node_for(user) == shard_name(self.index)
+
+    def __repr__(self) -> str:
+        return f"shard {self.index + 1}/{self.count}"
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index}"
+
+
+def _worker_main(target: Callable[..., None], args: Tuple[Any, ...], shard: ShardFilter) -> None:
+    # tag every log line with the shard, whatever format the target configured
+    for handler in logging.getLogger().handlers:
+        if handler.formatter is not None and handler.formatter._fmt:
+            handler.setFormatter(logging.Formatter(handler.formatter._fmt.replace("%(message)s", f"[{shard}] %(message)s")))
+    # the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(*args, shard=shard)
+
+
+class ShardSupervisor:
+    """
+    Runs `target(*args, shard=ShardFilter(i, shards))` in one process per
+    shard and keeps them running.
+
+    Users are spread over the shards by consistent hashing of the user id,
+    so every worker owns a stable subset with its own scheduler and HTTP
+    pool. A worker that exits is restarted with the same shard, which hands
+    it back exactly the users it had; the other workers are not touched.
+    Restarts back off exponentially (up to `max_backoff` seconds) while a
+    worker keeps dying within `stable_after` seconds.
+    """
+    def __init__(
+        self,
+        shards: int,
+        target: Callable[..., None],
+        args: Tuple[Any, ...] = (),
+        max_backoff: float = 60.0,
+        stable_after: float = 60.0,
+    ):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.shards = shards
+        self.target = target
+        self.args = args
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.restarts = 0
+        # spawn, not fork: workers start without the supervisor's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: Dict[int, Any] = {}
+        self._started: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        # shard -> monotonic time at which to restart it
+        self._pending: Dict[int, float] = {}
+        self._stopping = False
+
+    def _spawn(self, index: int) -> None:
+        shard = ShardFilter(index, self.shards)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.target, self.args, shard),
+            name=shard_name(index),
+        )
+        process.start()
+        self._workers[index] = process
+        self._started[index] = time.monotonic()
+        logger.info("Started %s (pid %d)", shard, process.pid)
+
+    def _reap(self, index: int) -> None:
+        process = self._workers.pop(index)
+        process.join()
+        if self._stopping:
+            return
+        ran = time.monotonic() - self._started[index]
+        backoff = 1.0 if ran >= self.stable_after else min(self._backoff.get(index, 0.5) * 2, self.max_backoff)
+        self._backoff[index] = backoff
+        self._pending[index] = time.monotonic() + backoff
+        logger.error("%s exited with code %s after %.0fs - restarting in %.0fs",
+                     ShardFilter(index, self.shards), process.exitcode, ran, backoff)
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def run(self, timeout: float = 10.0) -> None:
+        """
+        Starts every worker and supervises them until SIGTERM/SIGINT, then
+        stops the workers, killing those that do not exit within `timeout`.
+        """
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        for index in range(self.shards):
+            self._spawn(index)
+        logger.info("Supervising %d shard workers", self.shards)
+
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                for index, at in list(self._pending.items()):
+                    if at <= now:
+                        del self._pending[index]
+                        self.restarts += 1
+                        self._spawn(index)
+                wait_for = min([at - now for at in self._pending.values()] + [1.0])
+                sentinels = {p.sentinel: index for index, p in self._workers.items()}
+                for sentinel in wait(list(sentinels), timeout=max(0.0, wait_for)):
+                    self._reap(sentinels[sentinel])
+        finally:
+            self._stopping = True
+            self._shutdown(timeout)
+
+    def _shutdown(self, timeout: float) -> None:
+        for process in self._workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for index, process in self._workers.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("%s did not stop in time - killing it", ShardFilter(index, self.shards))
+                process.kill()
+                process.join()
+        self._workers.clear()
+        logger.info("All shard workers stopped (%d restarts)", self.restarts)
@@ -0,0 +1,295 @@
+import heapq
+import itertools
+import json
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta, tzinfo
+from functools import partial
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .config import Interval
+from .scheduler import Scheduler
+from .slack import AppliedState
+from .timers import Timer, next_fire_time
+
+WEEK = timedelta(days=7)
+
+# upper bounds of the calls-per-minute histogram buckets
+CALLS_PER_MINUTE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Event(NamedTuple):
+    """One Slack write the scheduler would make."""
+    at: datetime
+    user: Optional[str]
+    method: str
+    presence: Optional[str] = None
+    text: Optional[str] = None
+    emoji: Optional[str] = None
+    expiration: int = 0
+
+    def to_json(self) -> str:
+        record: Dict[str, object] = {"at": self.at.isoformat(timespec="minutes")}
+        if self.user is not None:
+            record["user"] = self.user
+        record["method"] = self.method
+        if self.method == "users.setPresence":
+            record["presence"] = self.presence
+        else:
+            record.update(status_text=self.text, status_emoji=self.emoji, status_expiration=self.expiration)
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+class VirtualTimers:
+    """
+    Timer backend running on a virtual clock: `advance` jumps straight to
+    the next fire instant and runs its callback, so a year of schedule is
+    replayed without sleeping. Like `TimerHeap`, it keeps epoch instants in
+    one heap, converted from the wall clock of each timer's zone with the
+    same DST rules. `now(tz)` is the clock to hand to a `Scheduler` in `tz`.
+    """
+
+    def __init__(self, start: datetime):
+        self.current = start.replace(second=0, microsecond=0).timestamp()
+        self.on_clock_jump: List[Callable[[], None]] = []
+        self.firing_at: Optional[float] = None
+        self.wakeups = 0
+        # (instant, seq, timer, planned wall-clock time in the timer's zone)
+        self._heap: List[Tuple[float, int, Timer, datetime]] = []
+        self._seq = itertools.count()
+
+    def now(self, tz: Optional[tzinfo] = None) -> datetime:
+        return datetime.fromtimestamp(self.current, tz)
+
+    def _push(self, timer: Timer, wall: datetime) -> None:
+        heapq.heappush(self._heap, (wall.timestamp(), next(self._seq), timer, wall))
+
+    def add(self, minute: int, callback: Callable[[], None], tz: Optional[tzinfo] = None) -> Timer:
+        timer = Timer(minute, callback, tz)
+        self._push(timer, next_fire_time(minute, self.now(tz)))
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        timer.cancelled = True
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self._heap if not entry[2].cancelled)
+
+    def wake(self) -> None:
+        pass
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        callback()
+
+    def stop(self) -> None:
+        pass
+
+    def advance(self, until: float) -> bool:
+        """
+        Move the clock to the next fire instant before `until` (epoch
+        seconds) and run that timer. Returns False, with the clock at
+        `until`, once none is left.
+        """
+        while self._heap and self._heap[0][0] < until:
+            fire_at, _, timer, wall = heapq.heappop(self._heap)
+            if timer.cancelled:
+                continue
+            self.current = fire_at
+            self.wakeups += 1
+            # a week later on the same wall clock, i.e. next_fire_time(timer.minute, wall)
+            self._push(timer, wall + WEEK)
+            self.firing_at = fire_at
+            try:
+                timer.callback()
+            finally:
+                self.firing_at = None
+            return True
+        self.current = until
+        return False
+
+
+class SimulatedUpdater:
+    """
+    Applies statuses with the same rules as `SlackUpdater`, including the
+    skipping of unchanged ones, but records the Slack calls instead of
+    making them.
+    """
+    __slots__ = ("user", "applied", "_emit", "_clock")
+
+    def __init__(self, user: Optional[str], emit: Callable[[Event], None], clock: Callable[[], datetime]):
+        self.user = user
+        self.applied = AppliedState()
+        self._emit = emit
+        self._clock = clock
+
+    @property
+    def saved_calls(self) -> int:
+        return self.applied.saved_calls
+
+    def apply_status(self, presence: str, text: str = "", emoji: str = "", expiration: int = 0) -> bool:
+        at = self._clock()
+        sent = False
+        if self.applied.needs_presence(presence):
+            self._emit(Event(at, self.user, "users.setPresence", presence=presence))
+            self.applied.presence = presence
+            sent = True
+        if (text or emoji) and self.applied.needs_profile(text, emoji, expiration, at.timestamp()):
+            self._emit(Event(at, self.user, "users.profile.set", text=text, emoji=emoji, expiration=expiration))
+            self.applied.text = text
+            self.applied.emoji = emoji
+            self.applied.expires = expiration
+            sent = True
+        return sent
+
+    def set_status(
+        self, presence: str, text: str = "", emoji: str = "", due: Optional[float] = None, expiration: int = 0
+    ) -> None:
+        self.apply_status(presence=presence, text=text, emoji=emoji, expiration=expiration)
+
+
+class Simulation:
+    """
+    Replays the schedules of one or more users from `start` with the real
+    `Scheduler` on `VirtualTimers`. `run` yields the Slack writes in the
+    order the service would make them: the initial status of every user at
+    `start`, then every transition up to `end`. Users are set up in sorted
+    order, so the stream is deterministic and can be diffed between config
+    versions.
+    """
+
+    def __init__(
+        self,
+        schedules: Dict[Optional[str], List[Interval]],
+        start: datetime,
+        use_expiration: bool = False,
+        timezones: Optional[Dict[Optional[str], Optional[tzinfo]]] = None,
+    ):
+        self.start = start.replace(second=0, microsecond=0)
+        self.timers = VirtualTimers(self.start)
+        self._pending: List[Event] = []
+        self.schedulers: Dict[Optional[str], Scheduler] = {}
+        timezones = timezones or {}
+        for user in sorted(schedules, key=lambda u: "" if u is None else u):
+            tz = timezones.get(user)
+            clock = partial(self.timers.now, tz)
+            self.schedulers[user] = Scheduler(
+                SimulatedUpdater(user, self._pending.append, clock),
+                schedules[user],
+                timers=self.timers,
+                user=user,
+                use_expiration=use_expiration,
+                tz=tz,
+                clock=clock,
+            )
+
+    @property
+    def saved_calls(self) -> int:
+        return sum(scheduler.updater.saved_calls for scheduler in self.schedulers.values())
+
+    @property
+    def coalesced(self) -> int:
+        return sum(scheduler.coalesced for scheduler in self.schedulers.values())
+
+    def _flush(self) -> Iterator[Event]:
+        # the updaters append to this very list, so it is emptied in place
+        events = self._pending[:]
+        self._pending.clear()
+        return iter(events)
+
+    def run(self, end: datetime) -> Iterator[Event]:
+        until = end.timestamp()
+        for scheduler in self.schedulers.values():
+            job = scheduler.get_current_job() if scheduler.intervals else None
+            if job:
+                scheduler.updater.set_status(
+                    presence=job.presence,
+                    text=job.status_text,
+                    emoji=job.status_emoji,
+                    expiration=scheduler.status_expiration(),
+                )
+            scheduler.schedule_jobs()
+        yield from self._flush()
+        while self.timers.advance(until):
+            if self._pending:
+                yield from self._flush()
+
+
+class CallStats:
+    """Slack calls of a simulation, per method and per minute, for capacity planning."""
+
+    def __init__(self):
+        self.by_method: Counter = Counter()
+        self.per_minute: Counter = Counter()
+
+    def add(self, event: Event) -> None:
+        self.by_method[event.method] += 1
+        # keyed by the epoch minute, so users in different zones line up
+        self.per_minute[int(event.at.timestamp()) // 60 * 60] += 1
+
+    def histogram(self) -> List[Tuple[str, int]]:
+        """(calls per minute, number of minutes) for every non-empty bucket."""
+        counts = [0] * (len(CALLS_PER_MINUTE_BUCKETS) + 1)
+        for calls in self.per_minute.values():
+            counts[bisect_left(CALLS_PER_MINUTE_BUCKETS, calls)] += 1
+        rows = []
+        lower = 1
+        for bound, count in zip(CALLS_PER_MINUTE_BUCKETS + (None,), counts):
+            label = f">{lower - 1}" if bound is None else str(bound) if bound == lower else f"{lower}-{bound}"
+            if count:
+                rows.append((label, count))
+            if bound is not None:
+                lower = bound + 1
+        return rows
+
+    def render(
+        self, start: datetime, end: datetime, users: int, saved_calls: int, coalesced: int, elapsed: float
+    ) -> str:
+        minutes = int(end.timestamp() - start.timestamp()) // 60
+        total = sum(self.by_method.values())
+        lines = [
+            f"Simulated {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} ({minutes:,} minutes, {users:,} users) "
+            f"in {elapsed:.2f}s ({minutes * users / max(elapsed, 1e-9):,.0f} simulated user-minutes/s)",
+            f"Slack calls: {total:,} ("
+            + ", ".join(f"{method} {count:,}" for method, count in sorted(self.by_method.items()))
+            + f"), {saved_calls:,} skipped as unchanged, "
+            f"{coalesced:,} transitions coalesced with another at the same instant",
+        ]
+        if self.per_minute:
+            peak_at, peak = max(self.per_minute.items(), key=lambda item: (item[1], -item[0]))
+            lines.append(f"Calls per minute: peak {peak:,} at {datetime.fromtimestamp(peak_at):%a %Y-%m-%d %H:%M}, "
+                         f"{len(self.per_minute):,} of {minutes:,} minutes with calls")
+            lines.append(f"{'calls/minute':>14} {'minutes':>10}")
+            lines += [f"{label:>14} {count:>10,}" for label, count in self.histogram()]
+        return "\n".join(lines)
+
+
+def simulate(
+    schedules: Dict[Optional[str], List[Interval]],
+    start: datetime,
+    end: datetime,
+    use_expiration: bool = False,
+    write: Optional[Callable[[str], None]] = None,
+    timezones: Optional[Dict[Optional[str], Optional[tzinfo]]] = None,
+) -> str:
+    """
+    Replay `schedules` from `start` to `end` (exclusive), pass every Slack
+    write as a JSON line to `write` and return the call statistics.
+    `timezones` maps users to their zone; `start` and `end` are local time
+    unless they are aware.
+    """
+    started = time.perf_counter()
+    simulation = Simulation(schedules, start, use_expiration, timezones)
+    stats = CallStats()
+    for event in simulation.run(end):
+        stats.add(event)
+        if write is not None:
+            write(event.to_json())
+    return stats.render(
+        simulation.start,
+        end,
+        len(schedules),
+        simulation.saved_calls,
+        simulation.coalesced,
+        time.perf_counter() - started,
+    )
@@ -1,32 +1,219 @@
 import logging
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import SCHEDULER_LAG, SKIPPED_CALLS, slack_call
 
 logger = logging.getLogger(__name__)
 
+class AppliedState:
+    """
+    Last presence and custom status successfully applied for one user, used to
+    suppress Slack calls that would not change anything. `None` means unknown.
+    `expires` is the `status_expiration` the custom status was sent with
+    (epoch seconds, 0 = never); once it has passed, Slack has cleared it.
+    `on_commit` is called with the state after every update that reached
+    Slack, e.g. to journal it.
+    """
+    __slots__ = ("presence", "text", "emoji", "expires", "saved_calls", "on_commit")
+
+    def __init__(self):
+        self.presence: str | None = None
+        self.text: str | None = None
+        self.emoji: str | None = None
+        self.expires = 0
+        self.saved_calls = 0
+        self.on_commit = None
+
+    def commit(self) -> None:
+        if self.on_commit is not None:
+            self.on_commit(self)
+
+    def needs_presence(self, presence: str) -> bool:
+        """Return True if `presence` differs from the applied one, else count a saved call."""
+        if self.presence == presence:
+            self.saved_calls += 1
+            SKIPPED_CALLS.inc("users.setPresence")
+            return False
+        return True
+
+    def profile_matches(self, text: str, emoji: str, expiration: int = 0, now: float | None = None) -> bool:
+        """
+        True if this custom status, with this expiration, is still set in
+        Slack at `now` (epoch seconds, default: the current time).
+        """
+        if self.expires and self.expires <= (time.time() if now is None else now):
+            return False
+        return self.text == text and self.emoji == emoji and self.expires == expiration
+
+    def needs_profile(self, text: str, emoji: str, expiration: int = 0, now: float | None = None) -> bool:
+        """Return True if the custom status differs from the applied one, else count a saved call."""
+        if self.profile_matches(text, emoji, expiration, now):
+            self.saved_calls += 1
+            SKIPPED_CALLS.inc("users.profile.set")
+            return False
+        return True
+
+
 class SlackUpdater:
-    def __init__(self, token: str):
-        self.client = WebClient(token=token)
+    def __init__(self, token: str, base_url: str | None = None, applied: AppliedState | None = None):
+        """`base_url` points the client at another Web API host, e.g. a local fake for load tests."""
+        # slack_sdk takes ~100ms to import, so it is loaded with the first client
+        from slack_sdk import WebClient
+
+        self.client = WebClient(token=token, base_url=base_url or WebClient.BASE_URL)
+        self.applied = applied if applied is not None else AppliedState()
 
-    def set_status(self, presence: str, text: str = "", emoji: str = "") -> None:
+    @property
+    def saved_calls(self) -> int:
+        """Number of Slack calls skipped because the status was already applied."""
+        return self.applied.saved_calls
+
+    def seed_from_slack(self) -> None:
         """
-        Set the Slack presence and optional custom status for the authenticated user.
-        This function logs its actions and catches `SlackApiError` to avoid
-        crashing the scheduler loop.
+        Seed the applied-state cache with the custom status currently set in
+        Slack, so a restart does not re-send an identical status. Presence is
+        left unknown because Slack reports the effective presence, not the
+        requested one.
         """
+        from slack_sdk.errors import SlackApiError
+
         try:
-            self.client.users_setPresence(presence=presence)
+            with slack_call("users.profile.get"):
+                profile = self.client.users_profile_get()["profile"]
+        except SlackApiError as e:
+            err = e.response.get("error") if hasattr(e, "response") else str(e)
+            logger.warning("Could not read current Slack status: %s", err)
+            return
+        self.applied.text = profile.get("status_text", "")
+        self.applied.emoji = profile.get("status_emoji", "")
+
+    def apply_status(self, presence: str, text: str = "", emoji: str = "", expiration: int = 0) -> bool:
+        """
+        Set the Slack presence and optional custom status for the authenticated user.
+        With `expiration` (epoch seconds), Slack clears the custom status by itself then.
+        Calls that would re-send the last applied value are skipped.
+        `SlackApiError` is propagated so callers can retry; whatever was
+        applied before the error stays recorded.
+        Returns True if any Slack call was made.
+        """
+        sent = False
+        if self.applied.needs_presence(presence):
+            with slack_call("users.setPresence"):
+                self.client.users_setPresence(presence=presence)
+            self.applied.presence = presence
+            sent = True
             logger.info("Presence set to %s", presence)
+        else:
+            logger.debug("Presence already %s - skipped", presence)
 
-            if text or emoji:
+        if text or emoji:
+            if self.applied.needs_profile(text, emoji, expiration):
                 profile = {
                     "status_text": text,
                     "status_emoji": emoji,
-                    "status_expiration": 0,
+                    "status_expiration": expiration,
                 }
-                self.client.users_profile_set(profile=profile)
+                with slack_call("users.profile.set"):
+                    self.client.users_profile_set(profile=profile)
+                self.applied.text = text
+                self.applied.emoji = emoji
+                self.applied.expires = expiration
+                sent = True
                 logger.info("Custom status set to '%s' %s", text, emoji)
+            else:
+                logger.debug("Custom status already '%s' %s - skipped", text, emoji)
+        if sent:
+            self.applied.commit()
+        return sent
 
+    def set_status(
+        self, presence: str, text: str = "", emoji: str = "", due: float | None = None, expiration: int = 0
+    ) -> None:
+        """
+        Like `apply_status`, but logs and swallows `SlackApiError` to avoid
+        crashing the scheduler loop.
+        `due` is the planned instant (epoch seconds) of the transition that
+        triggered the update, used to record the scheduler lag.
+        """
+        from slack_sdk.errors import SlackApiError
+
+        try:
+            sent = self.apply_status(presence=presence, text=text, emoji=emoji, expiration=expiration)
         except SlackApiError as e:
             err = e.response.get("error") if hasattr(e, "response") else str(e)
             logger.error("Slack API error: %s", err)
+            return
+        if sent and due is not None:
+            SCHEDULER_LAG.observe(time.time() - due)
+
+
+class ClientPool:
+    """
+    Bounded LRU of the `SlackUpdater`s (and their HTTP clients) behind
+    `LazySlackUpdater`s, so the number of live clients does not grow with
+    the number of users. A user evicted from the pool gets a new client on
+    its next status change; its applied state stays with the
+    `LazySlackUpdater`.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.created = 0
+        self._entries: "OrderedDict[LazySlackUpdater, SlackUpdater]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, owner: "LazySlackUpdater") -> SlackUpdater:
+        with self._lock:
+            updater = self._entries.get(owner)
+            if updater is not None:
+                self._entries.move_to_end(owner)
+                return updater
+            updater = self._entries[owner] = SlackUpdater(owner.token, base_url=owner.base_url, applied=owner.applied)
+            self.created += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return updater
+
+
+# shared by every LazySlackUpdater that is not given a pool
+CLIENTS = ClientPool()
+
+
+class LazySlackUpdater:
+    """
+    Holds a token and gets the underlying `SlackUpdater` (and its HTTP
+    client) from a shared bounded `ClientPool` on every status change.
+    Used by multi-user mode so idle users cost only this small object and
+    their applied state, and the clients of active users stay bounded.
+    """
+    __slots__ = ("token", "base_url", "applied", "pool")
+
+    def __init__(self, token: str, base_url: str | None = None, pool: ClientPool | None = None):
+        self.token = token
+        self.base_url = base_url
+        self.applied = AppliedState()
+        self.pool = pool if pool is not None else CLIENTS
+
+    @property
+    def updater(self) -> SlackUpdater:
+        return self.pool.get(self)
+
+    @property
+    def saved_calls(self) -> int:
+        return self.applied.saved_calls
+
+    def seed_from_slack(self) -> None:
+        self.updater.seed_from_slack()
+
+    def apply_status(self, presence: str, text: str = "", emoji: str = "", expiration: int = 0) -> bool:
+        return self.updater.apply_status(presence=presence, text=text, emoji=emoji, expiration=expiration)
+
+    def set_status(
+        self, presence: str, text: str = "", emoji: str = "", due: float | None = None, expiration: int = 0
+    ) -> None:
+        self.updater.set_status(presence=presence, text=text, emoji=emoji, due=due, expiration=expiration)
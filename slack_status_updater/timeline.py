@@ -0,0 +1,142 @@
+import heapq
+from bisect import bisect_right
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from .utils import is_minute_in_range
+
+if TYPE_CHECKING:
+    from .config import Interval
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_week(when: datetime) -> int:
+    """
+    Return the minute offset of `when` from Monday 00:00 (0..10079).
+    """
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+class Timeline:
+    """
+    Immutable, compiled view of a list of intervals over one week.
+
+    The week is split into segments at every point where the resolved job can
+    change (interval starts and time_range boundaries). Each segment stores the
+    job that is active during it, so "what is active at minute T" is a bisect.
+
+    Resolution rule: the most recent start (searching backwards through the
+    week, wrapping around) wins, so a status carries forward until replaced.
+    A job with a time_range only applies while the time of day falls in that
+    range. When several starts share the same minute, the interval listed
+    later wins, mirroring the order in which the timers would fire.
+    """
+    __slots__ = ("intervals", "_starts", "_jobs", "__weakref__")
+
+    def __init__(self, intervals: List["Interval"]):
+        self.intervals = list(intervals)
+        self._starts, self._jobs = self._compile(self.intervals)
+
+    @staticmethod
+    def _compile(intervals: List["Interval"]) -> Tuple[List[int], List[Optional["Interval"]]]:
+        # Group starts by the time_range that gates them (None = no range).
+        # Every start is keyed (minute_of_week, seq) so ties resolve to the later interval.
+        starts: List[Tuple[int, int, Optional[Tuple[int, int]]]] = []
+        gates = set()
+        for seq, job in enumerate(intervals):
+            gate = (job.range_start, job.range_end) if job.has_range else None
+            gates.add(gate)
+            for d in job.weekdays():
+                starts.append((d * MINUTES_PER_DAY + job.start, seq, gate))
+
+        if not starts:
+            return [0], [None]
+
+        starts.sort(key=lambda s: (s[0], s[1]))
+
+        # minute of the week -> gates opening then
+        opens: Dict[int, List[Tuple[int, int]]] = {}
+        boundaries = {0}
+        boundaries.update(m for m, _, _ in starts)
+        for gate in gates:
+            if gate is None:
+                continue
+            for d in range(7):
+                opens.setdefault(d * MINUTES_PER_DAY + gate[0], []).append(gate)
+                boundaries.add(d * MINUTES_PER_DAY + gate[0])
+                boundaries.add(d * MINUTES_PER_DAY + gate[1])
+
+        # Seed each group with its last start of the previous week so the sweep wraps around.
+        latest: Dict[Optional[Tuple[int, int]], Tuple[int, int]] = {}
+        for m, seq, gate in starts:
+            latest[gate] = (m - MINUTES_PER_WEEK, seq)
+
+        # Max-heap of (-minute, -seq, gate) candidates. An entry is dropped lazily once its
+        # gate is closed or a later start replaced it; a gate is pushed again when it
+        # opens, so every point costs O(log n) instead of a scan over all gates.
+        heap = [(-m, -seq, gate) for gate, (m, seq) in latest.items()]
+        heapq.heapify(heap)
+
+        seg_starts: List[int] = []
+        seg_jobs: List[Optional["Interval"]] = []
+        i = 0
+        for point in sorted(boundaries):
+            # only the last start of each gate at this point can win, so push one entry per gate
+            changed = set(opens.get(point, ()))
+            while i < len(starts) and starts[i][0] <= point:
+                m, seq, gate = starts[i]
+                latest[gate] = (m, seq)
+                changed.add(gate)
+                i += 1
+            for gate in changed:
+                m, seq = latest[gate]
+                heapq.heappush(heap, (-m, -seq, gate))
+
+            tod = point % MINUTES_PER_DAY
+            while heap:
+                m, seq, gate = heap[0]
+                if latest[gate] == (-m, -seq) and (gate is None or is_minute_in_range(tod, gate[0], gate[1])):
+                    break
+                heapq.heappop(heap)
+            job = intervals[-heap[0][1]] if heap else None
+
+            if seg_jobs and seg_jobs[-1] is job:
+                continue
+            seg_starts.append(point)
+            seg_jobs.append(job)
+
+        return seg_starts, seg_jobs
+
+    def job_at(self, minute: int) -> Optional["Interval"]:
+        """
+        Return the job active at `minute` of the week (Monday 00:00 = 0).
+        """
+        return self._jobs[bisect_right(self._starts, minute % MINUTES_PER_WEEK) - 1]
+
+    def job_at_time(self, when: datetime) -> Optional["Interval"]:
+        """
+        Return the job active at the wall-clock datetime `when`.
+        """
+        return self.job_at(minute_of_week(when))
+
+    def next_transition(self, minute: int) -> int:
+        """
+        Return the minute of the week at which the segment containing `minute`
+        ends. The result may be >= MINUTES_PER_WEEK when it wraps to next week.
+        """
+        minute %= MINUTES_PER_WEEK
+        idx = bisect_right(self._starts, minute)
+        if idx < len(self._starts):
+            return self._starts[idx]
+        return MINUTES_PER_WEEK + self._starts[0]
+
+    def segments(self) -> Iterator[Tuple[int, int, Optional["Interval"]]]:
+        """
+        Yield (start, end, job) for every segment of the week, end exclusive.
+        """
+        bounds = self._starts + [MINUTES_PER_WEEK]
+        for idx, job in enumerate(self._jobs):
+            yield bounds[idx], bounds[idx + 1], job
+
@@ -0,0 +1,302 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, tzinfo
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import TIMER_LAG, TIMERS, WAKEUPS
+from .timeline import MINUTES_PER_DAY, minute_of_week
+from .utils import format_minute
+
+logger = logging.getLogger(__name__)
+
+DAY_ATTRS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def next_fire_time(minute: int, now: datetime) -> datetime:
+    """
+    Return the first wall-clock datetime strictly after `now` that falls on
+    `minute` of the week (Monday 00:00 = 0), in the timezone of `now` (local
+    time when it is naive).
+
+    A wall time skipped by a DST gap maps to the instant the clock jumps
+    past it (02:30 fires at 03:30). A wall time repeated by a DST fold fires
+    at its first occurrence only. The second occurrence is used only when
+    `now` is already in the second pass of the repeated hour, before that
+    wall time. So a timer rescheduled from the instant it fired never fires
+    twice, and from anywhere else in the first pass the next fire is a week
+    later.
+    """
+    week_start = now.replace(second=0, microsecond=0, fold=0) - timedelta(minutes=minute_of_week(now))
+    candidate = week_start + timedelta(minutes=minute)
+    if candidate <= now:
+        candidate += timedelta(days=7)
+    elif now.tzinfo is not None and candidate.timestamp() <= now.timestamp():
+        # `now` is in the repeated hour of a fold, after the first occurrence of `minute`
+        candidate = candidate.replace(fold=1)
+    return candidate
+
+
+class Timer:
+    """
+    A weekly recurring callback registered with a timer backend. `minute` is
+    a minute of the week in `tz`, or in local time when `tz` is None.
+    """
+    __slots__ = ("minute", "callback", "tz", "fire_at", "cancelled")
+
+    def __init__(self, minute: int, callback: Callable[[], None], tz: Optional[tzinfo] = None):
+        self.minute = minute
+        self.callback = callback
+        self.tz = tz
+        self.fire_at = 0.0
+        self.cancelled = False
+
+
+class TimerHeap:
+    """
+    Timer backend driven by a min-heap of precomputed next-fire instants.
+
+    The run loop blocks until the earliest instant instead of polling. It is
+    woken early by `stop()` or `wake()` (e.g. after timers were added from
+    another thread), and it re-checks the wall clock at least every
+    `max_sleep` seconds. If the wall clock moved by more than
+    `jump_threshold` seconds relative to the monotonic clock (suspend/resume,
+    NTP step), every fire instant is recomputed and the `on_clock_jump`
+    callbacks are invoked so callers can re-sync their state.
+
+    While a callback runs, `firing_at` holds the instant (epoch seconds) it
+    was planned for.
+
+    Fire instants are epoch seconds, whatever the timezone of the timer, so
+    the timers of users in many zones share one heap. Each timer's next
+    instant is converted from its zone's wall clock when it is added and
+    again after it fired, which picks up DST changes week by week.
+    """
+
+    def __init__(self, max_sleep: float = 60.0, jump_threshold: float = 5.0):
+        self.max_sleep = max_sleep
+        self.jump_threshold = jump_threshold
+        self.on_clock_jump: List[Callable[[], None]] = []
+        self.wakeups = 0
+        self.firing_at: Optional[float] = None
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._calls: deque = deque()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        TIMERS.set_function(self.__len__)
+        WAKEUPS.set_function(lambda: self.wakeups)
+
+    def _push(self, timer: Timer, now: float) -> None:
+        timer.fire_at = next_fire_time(timer.minute, datetime.fromtimestamp(now, timer.tz)).timestamp()
+        heapq.heappush(self._heap, (timer.fire_at, next(self._seq), timer))
+
+    def add(self, minute: int, callback: Callable[[], None], tz: Optional[tzinfo] = None) -> Timer:
+        """
+        Register `callback` to run every week at `minute` of the week, on the
+        wall clock of `tz` (default: local time).
+        """
+        timer = Timer(minute, callback, tz)
+        with self._lock:
+            self._push(timer, time.time())
+        self._wakeup.set()
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """
+        Cancel a timer returned by `add`. The heap entry is dropped lazily.
+        """
+        timer.cancelled = True
+
+    def __len__(self) -> int:
+        return sum(1 for _, _, t in self._heap if not t.cancelled)
+
+    def wake(self) -> None:
+        """Wake the run loop so it re-evaluates the heap."""
+        self._wakeup.set()
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        """Run `callback` once on the timer thread, e.g. to apply a config reload."""
+        self._calls.append(callback)
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """Stop the run loop as soon as possible."""
+        self._stopped = True
+        self._wakeup.set()
+
+    def _recompute(self) -> None:
+        now = time.time()
+        with self._lock:
+            timers = [t for _, _, t in self._heap if not t.cancelled]
+            self._heap = []
+            for timer in timers:
+                self._push(timer, now)
+
+    def _pop_due(self) -> List[Tuple[float, Timer]]:
+        due: List[Tuple[float, Timer]] = []
+        now_ts = time.time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_ts:
+                _, _, timer = heapq.heappop(self._heap)
+                if timer.cancelled:
+                    continue
+                due.append((timer.fire_at, timer))
+                # reschedule from the planned instant, not from now, so a late wakeup cannot skip a week
+                self._push(timer, timer.fire_at)
+        return due
+
+    def _next_timeout(self) -> float:
+        with self._lock:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return self.max_sleep
+            return max(0.0, min(self._heap[0][0] - time.time(), self.max_sleep))
+
+    def run_forever(self) -> None:
+        """Run due timers until `stop()` is called."""
+        self._stopped = False
+        while not self._stopped:
+            _run_calls(self._calls)
+            for planned, timer in self._pop_due():
+                self.firing_at = planned
+                TIMER_LAG.observe(time.time() - planned)
+                try:
+                    timer.callback()
+                except Exception as e:
+                    logger.error("Scheduled job failed: %s", e)
+                finally:
+                    self.firing_at = None
+
+            timeout = self._next_timeout()
+            wall_before = time.time()
+            mono_before = time.monotonic()
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            self.wakeups += 1
+
+            drift = time.time() - (wall_before + time.monotonic() - mono_before)
+            if abs(drift) > self.jump_threshold:
+                logger.warning("Wall clock jumped by %.0fs - recomputing timers", drift)
+                self._recompute()
+                for callback in self.on_clock_jump:
+                    try:
+                        callback()
+                    except Exception as e:
+                        logger.error("Clock jump handler failed: %s", e)
+
+
+class PollingTimers:
+    """
+    Legacy timer backend: the `schedule` library polled once per second.
+
+    `schedule` only understands timezones through pytz, so a timer in
+    another zone is planned one occurrence at a time on the local clock:
+    its next instant is converted with `next_fire_time` and re-planned
+    after it fired, which follows the DST changes of both zones.
+    """
+
+    def __init__(self):
+        import schedule
+
+        self.on_clock_jump: List[Callable[[], None]] = []
+        self.firing_at: Optional[float] = None
+        self._schedule = schedule.Scheduler()
+        self._cancel_job = schedule.CancelJob
+        self._calls: deque = deque()
+        self._stop = threading.Event()
+        # zoned timer -> `schedule` job of its next occurrence
+        self._zoned: Dict[Timer, Any] = {}
+        self.wakeups = 0
+        TIMERS.set_function(self.__len__)
+        WAKEUPS.set_function(lambda: self.wakeups)
+
+    def _job(self, minute: int, callback: Callable[[], None], once: bool = False):
+        day, minute_of_day = divmod(minute, MINUTES_PER_DAY)
+        job = getattr(self._schedule.every(), DAY_ATTRS[day]).at(format_minute(minute_of_day))
+
+        def run():
+            # the job's next_run still holds the instant it was due at
+            self.firing_at = job.next_run.timestamp()
+            TIMER_LAG.observe(time.time() - self.firing_at)
+            try:
+                callback()
+            finally:
+                self.firing_at = None
+            return self._cancel_job if once else None
+
+        return job.do(run)
+
+    def _plan(self, timer: Timer) -> None:
+        fire_at = next_fire_time(timer.minute, datetime.now(timer.tz))
+        local = datetime.fromtimestamp(fire_at.timestamp())
+        timer.fire_at = fire_at.timestamp()
+
+        def run() -> None:
+            try:
+                timer.callback()
+            finally:
+                if not timer.cancelled:
+                    self._plan(timer)
+
+        self._zoned[timer] = self._job(minute_of_week(local), run, once=True)
+
+    def add(self, minute: int, callback: Callable[[], None], tz: Optional[tzinfo] = None):
+        if tz is None:
+            return self._job(minute, callback)
+        timer = Timer(minute, callback, tz)
+        self._plan(timer)
+        return timer
+
+    def cancel(self, job) -> None:
+        if isinstance(job, Timer):
+            job.cancelled = True
+            job = self._zoned.pop(job, None)
+            if job is None:
+                return
+        self._schedule.cancel_job(job)
+
+    def __len__(self) -> int:
+        return len(self._schedule.get_jobs())
+
+    def wake(self) -> None:
+        pass
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        self._calls.append(callback)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_forever(self) -> None:
+        self._stop.clear()
+        while not self._stop.is_set():
+            _run_calls(self._calls)
+            self._schedule.run_pending()
+            self._stop.wait(1)
+            self.wakeups += 1
+
+
+def _run_calls(calls: deque) -> None:
+    while calls:
+        callback = calls.popleft()
+        try:
+            callback()
+        except Exception as e:
+            logger.error("Deferred call failed: %s", e)
+
+
+def create_timers(mode: Optional[str] = None):
+    """
+    Return a timer backend for `mode` ("timer" or "poll").
+    """
+    if mode in (None, "timer"):
+        return TimerHeap()
+    if mode == "poll":
+        return PollingTimers()
+    raise ValueError(f"Unknown scheduler mode: '{mode}'")
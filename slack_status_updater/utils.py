@@ -1,5 +1,6 @@
+import time
 from datetime import datetime
-from typing import List, Union
+from typing import List, Optional, Tuple, Union
 
 def parse_time(timestr: str) -> datetime.time:
     """
@@ -10,6 +11,12 @@ def parse_time(timestr: str) -> datetime.time:
     except ValueError:
         raise ValueError(f"Invalid time format for '{timestr}', expected HH:MM")
 
+def format_minute(minute: int) -> str:
+    """
+    Format a minute of the day as HH:MM.
+    """
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
 def parse_days(days: Union[str, List[str]]) -> List[int]:
     """
     Parse days specification and return list of weekday numbers (0=Monday, 6=Sunday).
@@ -64,6 +71,14 @@ def is_time_in_range(current_time: datetime.time, start_time: datetime.time, end
         # Range crosses midnight (e.g., 22:00 to 06:00)
         return current_time >= start_time or current_time < end_time
 
+def is_minute_in_range(minute: int, start: int, end: int) -> bool:
+    """
+    Minute-of-day equivalent of `is_time_in_range`.
+    """
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
 def is_day_match(current_weekday: int, allowed_days: List[int]) -> bool:
     """
     Check if current weekday matches any of the allowed days.
@@ -73,3 +88,26 @@ def is_day_match(current_weekday: int, allowed_days: List[int]) -> bool:
         allowed_days: List of allowed weekdays
     """
     return current_weekday in allowed_days
+
+class PhaseTimer:
+    """
+    Wall-clock durations of consecutive named phases, e.g. of startup.
+    """
+    def __init__(self, start: Optional[float] = None):
+        """`start` is a `time.perf_counter()` reading, e.g. taken before the imports."""
+        self.phases: List[Tuple[str, float]] = []
+        self._start = self._last = start if start is not None else time.perf_counter()
+
+    def elapsed(self) -> float:
+        """Seconds from the start to the end of the last phase."""
+        return self._last - self._start
+
+    def mark(self, name: str) -> None:
+        """End the current phase and record it as `name`."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def summary(self) -> str:
+        parts = [f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases]
+        return f"{', '.join(parts)} (total {self.elapsed() * 1000:.1f}ms)"
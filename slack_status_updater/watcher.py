@@ -0,0 +1,127 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event bits we care about
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+Signature = Tuple[int, int, int]
+
+
+def _file_signature(path: str) -> Optional[Signature]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _open_inotify(directories: List[str]) -> Optional[int]:
+    """
+    Return an inotify fd watching `directories`, or None where inotify is unavailable.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    for directory in directories:
+        if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+    return fd
+
+
+class FileWatcher:
+    """
+    Calls `on_change` with the list of paths whose content changed.
+
+    `paths` may contain files and directories; for a directory, every YAML
+    file in it is tracked, so created and deleted files are reported too.
+    A change means the (mtime, size, inode) signature moved, so touching a file
+    without writing it, or events for unrelated files, are ignored.
+
+    On Linux the thread sleeps on inotify watches of the parent directories
+    (directories rather than files, so editors that replace the file on save
+    are caught). Elsewhere it falls back to re-stat'ing every `poll_interval`
+    seconds, which is also the upper bound on how long inotify waits.
+    """
+
+    def __init__(self, paths: List[str], on_change: Callable[[List[str]], None], poll_interval: float = 2.0):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[str, Optional[Signature]]:
+        snapshot: Dict[str, Optional[Signature]] = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                for name in os.listdir(path):
+                    if os.path.splitext(name)[1] in (".yml", ".yaml"):
+                        full = os.path.join(path, name)
+                        snapshot[full] = _file_signature(full)
+            else:
+                snapshot[path] = _file_signature(path)
+        return snapshot
+
+    def check(self) -> List[str]:
+        """Re-stat the watched paths and return the ones that changed."""
+        snapshot = self._take_snapshot()
+        changed = sorted(p for p in snapshot.keys() | self._snapshot.keys() if snapshot.get(p) != self._snapshot.get(p))
+        self._snapshot = snapshot
+        return changed
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        directories = sorted({p if os.path.isdir(p) else os.path.dirname(p) for p in self.paths})
+        fd = _open_inotify(directories)
+        logger.info("Watching %s for changes (%s)", ", ".join(self.paths), "inotify" if fd is not None else "polling")
+        try:
+            while not self._stop.is_set():
+                if fd is not None:
+                    readable, _, _ = select.select([fd], [], [], self.poll_interval)
+                    if readable:
+                        # let the writer finish, then drain the queued events
+                        self._stop.wait(0.2)
+                        try:
+                            while os.read(fd, 65536):
+                                pass
+                        except BlockingIOError:
+                            pass
+                elif self._stop.wait(self.poll_interval):
+                    break
+
+                changed = self.check()
+                if changed:
+                    try:
+                        self.on_change(changed)
+                    except Exception as e:
+                        logger.error("Config reload failed: %s", e)
+        finally:
+            if fd is not None:
+                os.close(fd)